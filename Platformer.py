@@ -2,16 +2,31 @@
 # Jumpy! (a platform game) - Part 1
 # Video link: https://www.youtube.com/watch?v=uWvb3QzA48c
 # Project setup
+import os
 import pygame 
 import random
+import sys
+import threading
+import time
 from settings import *
 from sprites import *
 from spritesheet_functions import *
+from collision import *
+from rendering import *
+from text_renderer import *
+from inputs import *
+from animation import *
+from frame_cache import FrameCache
+from chunked_map import *
+from enemy_engine import EnemyEngine, ENGINE_AVAILABLE
+from profiler import Profiler
+from scheduler import UpdateScheduler
+from navigation import Navigation
+from replay import ReplayRecorder
 from os import path
 
 # TO DO
 # Invunerability powerup
-# Fix player falling through platforms whilst dying when jump key pressed
 # Enemy hit points
 
 class Camera:
@@ -19,7 +34,10 @@ class Camera:
     def __init__(self, game):
 
         self.rect = pygame.Rect(0, 0, WIDTH, HEIGHT)
+        self.view = pygame.Rect(-CULL_MARGIN, -CULL_MARGIN, WIDTH + 2 * CULL_MARGIN, HEIGHT + 2 * CULL_MARGIN)  # visible map area plus margin, in map pixels
         self.game = game
+        self.drawn = 0  # sprites passing / failing the visibility test this frame
+        self.culled = 0
 
     def update(self, target):
         # update camera offset according to player's new position
@@ -32,14 +50,30 @@ class Camera:
         x_offset = max(-(self.game.map.width - WIDTH), x_offset)  # right map edge
         y_offset = max(-(self.game.map.height - HEIGHT), y_offset)  # bottom map edge
 
+        self.move_to(x_offset, y_offset)
+
+    def move_to(self, x_offset, y_offset):
         # reposition camera rect
         self.rect.x = x_offset
         self.rect.y = y_offset
+        self.view.topleft = (-x_offset - CULL_MARGIN, -y_offset - CULL_MARGIN)
 
     def apply(self, entity):
         # move on screen objects according to camera offset e.g. player moves right, map objects shift left
         return entity.rect.move(self.rect.topleft)
 
+    def is_visible(self, entity):
+        # True if entity rect overlaps the screen (plus margin).  Tallies drawn/culled sprites for the current frame
+        if self.view.colliderect(entity.rect):
+            self.drawn += 1
+            return True
+        self.culled += 1
+        return False
+
+    def reset_counts(self):
+        self.drawn = 0
+        self.culled = 0
+
 
 class Map:
 
@@ -50,24 +84,50 @@ class Map:
                 line = line.replace("\t", '')  # remove tab scape characters
                 self.data.append(line.strip())  # .strip prevents invisible new line characters being read from text file
 
-        self.width = len(self.data[0]) * TILESIZE  # pixel width of the map
-        self.height = len(self.data) * TILESIZE
+        self.cols = len(self.data[0])  # map size in tiles
+        self.rows = len(self.data)
+        self.width = self.cols * TILESIZE  # pixel width of the map
+        self.height = self.rows * TILESIZE
+        self.streamed = False  # every tile is turned into a sprite when the level loads
 
 
 class Game:
 
-    def __init__(self):
+    def __init__(self, headless=False, map_file='map.txt', seed=None, enemy_engine=ENEMY_ENGINE, dirty_rects=DIRTY_RECTS,
+                 pick_ups=PICK_UPS, scheduler=UPDATE_SCHEDULER, background_load=False):
         # initialize game window, etc
-        pygame.init()
-        pygame.mixer.init()
+        self.start_time = time.perf_counter()
+        self.startup_times = {}  # startup milestone: seconds since start_time
+        self.headless = headless  # no window or keyboard: advance the game with step()
+        self.map_file = map_file
+        self.seed = seed  # seed for pick up placement, None for a different layout every game
+        self.random = random.Random(seed)
+        self.level_seed = seed  # seed the current level's layout was made with (recorded in replays)
+        self.recorder = None  # ReplayRecorder while a game is being recorded
+        self.pick_up_count = pick_ups  # pick ups scattered over a .txt map's platforms
+        self.use_scheduler = scheduler  # update only what is near the camera (scheduler.py)
+        self.use_enemy_engine = enemy_engine and ENGINE_AVAILABLE  # batched enemy updates, only if numpy is installed
+        if headless:
+            os.environ["SDL_VIDEODRIVER"] = "dummy"  # must be set before pygame.display.init()
+        pygame.display.init()  # only the pygame modules the game uses- there is no sound
+        pygame.font.init()
         pygame.display.set_caption(TITLE)
         self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
         self.camera = Camera(self)
+        self.text = TextRenderer()  # font and text surface cache for HUD/menus
+        self.renderer = DirtyRenderer(self.screen) if dirty_rects else None  # only redraw what changed (low power machines)
+        self.profiler = Profiler()  # per phase frame timings, overlay on F3
+        self.frames_drawn = 0
+        self.alpha = 1  # how far draw() is between the previous tick and the current one
+        self.previous = {}  # moving sprite: rect.topleft before the current tick
+        self.previous_camera = (0, 0)
 
         self.clock = pygame.time.Clock()
         self.elapsed_time = 0
         self.dt = 0  # time for 1 mainloop
         self.running = True  # in game
+        self.inputs = NO_INPUT  # controls held this tick, read by Player.update
+        self.animator = Animator()
 
         # animation images
         self.player_animations = {"idle": {"L": [], "R": [], "T": 1},
@@ -82,30 +142,83 @@ class Game:
                                   "climb": {"L": [], "R": [], "T": 0.3}}  # spider animations
         self.missile_animations = {"fly": {"L": [], "R": [], "T": 1},
                                    "explode": {"L": [], "R": [], "T": 0.5}}
-        self.load_data()
-
-    def load_data(self):
-
-        self.dir = "C:\\Users\\ben_s\\Documents\\Python_Scripts\\Pygame_Templates\\Platformer_nophysics"
-        self.map = Map(path.join(self.dir, 'map.txt'))  # create map object from Map class, tilemap.py
-
-        with open(path.join(self.dir, HIGHSCORE_FILE), 'r') as f:
+        # enemy map tile: (animations dict, spritesheet (col, row, image count) of each action).  Cut when first needed
+        self.enemy_sheets = {'c': (self.ctpll_animations, {"walk": (0, 1, 2)}),
+                             'b': (self.bird_animations, {"fly": (7, 0, 2)}),
+                             's': (self.spider_animations, {"walk": (10, 1, 2)})}
+        self.enemy_clips = {}  # enemy map tile: animation clips
+
+        self.dir = path.dirname(path.abspath(__file__))
+        with open(path.join(self.dir, HIGHSCORE_FILE), 'r') as f:  # needed by the start screen, so not left to load_data
             try:
                 self.highscore = int(f.read())
             except:
                 self.highscore = 0
 
-        # background image
-        self.background = pygame.image.load(path.join("Images", "Background.png")).convert()
+        self.loader = None  # thread running load_data() while the start screen is up
+        self.load_error = None
+        if background_load:
+            self.loader = threading.Thread(target=self.load_in_background, daemon=True)
+            self.loader.start()
+        else:
+            self.load_data()
+            self.prepare_data()
+
+    def load_in_background(self):
+        try:
+            self.load_data()
+        except Exception as error:  # raised again in the main thread by finish_loading()
+            self.load_error = error
+
+    def finish_loading(self):
+        """ Wait for a background load_data() to finish, then prepare what it read here on the main thread.  The
+            start screen calls this as soon as the loader is done, so it is normally over before a key is pressed."""
+        if self.loader is None:
+            return
+        self.loader.join()
+        self.loader = None
+        if self.load_error is not None:
+            raise self.load_error
+        self.prepare_data()
+
+    def mark_startup(self, milestone):
+        """ Record the time since the game was created that milestone was first reached."""
+        if milestone not in self.startup_times:
+            self.startup_times[milestone] = time.perf_counter() - self.start_time
 
-        # load spritesheets
-        self.player_spritesheet = SpriteSheet(player_sprites)
-        self.enemy_spritesheet = SpriteSheet(enemy_sprites)
-        self.pickup_spritesheet = SpriteSheet(pick_up_sprites)
+    def load_data(self):
+        """ Read the map and decode the images.  May run on the loader thread, so no surface is converted to the
+            display format here- prepare_data() does that on the main thread."""
+        if self.map_file == ENDLESS_MAP:
+            self.map = EndlessMap()  # generated as the player climbs, streamed in chunks (chunked_map.py)
+        elif self.map_file.endswith(CHUNKED_MAP_EXT):
+            self.map = ChunkedMap(path.join(self.dir, self.map_file))  # large level, streamed in chunks (chunked_map.py)
+        else:
+            self.map = Map(path.join(self.dir, self.map_file))  # create map object from Map class, tilemap.py
+
+        # background layers
+        self.background_images = [(pygame.image.load(path.join("Images", file)), factor_x, factor_y, colourkey)
+                                  for file, factor_x, factor_y, colourkey in BACKGROUND_LAYERS]
+
+        # load spritesheets (frames come from the on-disk frame cache when it is up to date)
+        self.frame_cache = FrameCache(path.join(self.dir, FRAME_CACHE_FILE), (player_sprites, enemy_sprites, pick_up_sprites))
+        self.player_spritesheet = SpriteSheet(player_sprites, self.frame_cache)
+        self.enemy_spritesheet = SpriteSheet(enemy_sprites, self.frame_cache)
+        self.pickup_spritesheet = SpriteSheet(pick_up_sprites, self.frame_cache)
+        if not self.frame_cache.loaded:  # no usable atlas- every frame will be cut from the sheets
+            for spritesheet in (self.player_spritesheet, self.enemy_spritesheet, self.pickup_spritesheet):
+                spritesheet.load_sheet()
 
         # load images
-        self.pltf_image = pygame.image.load(path.join("Images", "platform_tile.png")).convert()
-        self.pltf_image = pygame.transform.scale(self.pltf_image, (TILESIZE, TILESIZE))  # fit platform tile image to TILESIZE
+        self.pltf_image = pygame.image.load(path.join("Images", "platform_tile.png"))  # converted by prepare_data()
+
+    def prepare_data(self):
+        """ Convert what load_data() read to the display format and cut the animation frames.  Surface conversion
+            has to happen on the main thread, so after a background load this runs in finish_loading()."""
+        self.frame_cache.convert()
+        self.background = Background(self.background_images)
+        self.background_images = None
+        self.pltf_image = pygame.transform.scale(self.pltf_image.convert(), (TILESIZE, TILESIZE))  # fit platform tile image to TILESIZE
         self.pick_up_images = self.pickup_spritesheet.load_animation(0, 1, TILESIZE, TILESIZE, 32)  # list containing all pick_up images
         self.speedboost_image = self.pickup_spritesheet.get_image(288, 0, pick_up_sprites["step_x"], pick_up_sprites["step_y"], 2 * TILESIZE, 2 * TILESIZE)
         self.jumpboost_image = self.pickup_spritesheet.get_image(192, 0, pick_up_sprites["step_x"], pick_up_sprites["step_y"], 2 * TILESIZE, 2 * TILESIZE)
@@ -116,41 +229,68 @@ class Game:
         self.load_animations(self.player_animations["jump"], self.player_spritesheet, 5, 0, PLAYER_WIDTH, PLAYER_HEIGHT, 1)
         self.load_animations(self.player_animations["fall"], self.player_spritesheet, 1, 1, PLAYER_WIDTH, PLAYER_HEIGHT, 5)
         self.load_animations(self.player_animations["die"], self.player_spritesheet, 0, 3, PLAYER_WIDTH, PLAYER_HEIGHT, 10)
-        # load enemy animations
-        self.load_animations(self.ctpll_animations["walk"], self.enemy_spritesheet, 0, 1, ENEMY_WIDTH, ENEMY_HEIGHT, 2)
-        self.load_animations(self.bird_animations["fly"], self.enemy_spritesheet, 7, 0, ENEMY_WIDTH, ENEMY_HEIGHT, 2)
-        self.load_animations(self.spider_animations["walk"], self.enemy_spritesheet, 10, 1, ENEMY_WIDTH, ENEMY_HEIGHT, 2)
+        # load animations of the enemies on the map (streamed maps and other enemy types load theirs when first spawned)
+        if not self.map.streamed:
+            tiles = set("".join(self.map.data))
+            for tile in self.enemy_sheets:
+                if tile in tiles:
+                    self.enemy_animations(tile)
         # load missile animations
         self.load_animations(self.missile_animations["fly"], self.enemy_spritesheet, 2, 5, MISSILE_WIDTH, MISSILE_HEIGHT, 1)
         self.load_animations(self.missile_animations["explode"], self.enemy_spritesheet, 2, 5, MISSILE_WIDTH, MISSILE_HEIGHT, 3)
 
+        # resolve frame lists into clips with precomputed frame periods
+        self.player_animations = make_clips(self.player_animations)
+        self.missile_animations = make_clips(self.missile_animations)
+        self.frame_cache.save()  # write any newly cut frames for next start
+        self.mark_startup("assets loaded")
+
+    def enemy_animations(self, tile):
+        """ Animation clips for an enemy map tile ('c', 'b' or 's'), cut from the spritesheet the first time."""
+        clips = self.enemy_clips.get(tile)
+        if clips is None:
+            animations, actions = self.enemy_sheets[tile]
+            for action, (col, row, image_count) in actions.items():
+                self.load_animations(animations[action], self.enemy_spritesheet, col, row, ENEMY_WIDTH, ENEMY_HEIGHT, image_count)
+            clips = self.enemy_clips[tile] = make_clips(animations)
+        return clips
+
     def load_animations(self, anim_dict, spritesheet, col, row, w_new, h_new, image_count):
 
         anim_dict["R"] = spritesheet.load_animation(col, row, w_new, h_new, image_count)
-        for frame in anim_dict["R"]:
-            anim_dict["L"].append(pygame.transform.flip(frame, True, False))
-
-    def animate(self, sprite):
-
-        time_period = sprite.animations[sprite.actionvar]["T"] / len(sprite.animations[sprite.actionvar][sprite.direction])  # time period for which a single anim frame displayed
+        anim_dict["L"] = spritesheet.load_animation(col, row, w_new, h_new, image_count, flip=True)
 
-        rem_new = self.elapsed_time % time_period  # remainder used to detect when elapsed time has increased by a single time period, and therefore go to next frame
-        if rem_new < sprite.rem_past:
-            sprite.current_frame += 1
+    def new(self):  # start a new game
 
-        sprite.rem_past = rem_new
+        self.start_game()
+        try:
+            self.run()
+        finally:
+            self.end_game()
 
-        if sprite.current_frame == len(sprite.animations[sprite.actionvar][sprite.direction]):  # if on last frame
-            sprite.current_frame = 0  # reset for next animation
-            return True
+    def start_game(self, record=RECORD_REPLAYS, replay_folder=REPLAY_DIR):
+        """ Load a level with a seed of its own, recording it to replay_folder if record is set."""
+        self.level_seed = self.random.getrandbits(32)  # each game gets its own seed, so its replay can rebuild the level
+        self.random.seed(self.level_seed)
+        self.load_level()
+        if record:
+            self.recorder = ReplayRecorder.for_game(self, replay_folder)
 
-        sprite.image = sprite.animations[sprite.actionvar][sprite.direction][sprite.current_frame]
+    def end_game(self):
+        if self.recorder:
+            self.recorder.close(self.score if not self.playing else None)  # no result if the game crashed
+            self.recorder = None
 
-    def new(self):  # start a new game
+    def load_level(self):
 
+        self.finish_loading()
+        self.playing = True
         self.score = 0  # players score
+        self.elapsed_time = 0  # jump timing, missile cooldown and animations all count from the start of the level
+        self.dt = 0
+        self.animator = Animator()
         plf_coords = []  # store rect.x, rect.y for each platform tile generated
-        self.thread_coords = []  # for drawing spider threads
+        self.threads = ThreadStore()  # one thread per climbing spider
 
         # init sprite groups
         self.all_sprites = pygame.sprite.Group()
@@ -158,57 +298,111 @@ class Game:
         self.enemies = pygame.sprite.Group()
         self.pick_ups = pygame.sprite.Group()
         self.missiles = pygame.sprite.Group()
-
-        # load map data from map.txt file: create platform, player, enemy sprites accordingly
-        for row, tiles in enumerate(self.map.data):
-            for col, tile in enumerate(tiles):
-
-                if tile == '1':
-                    ptf = Platform(col, row, self.pltf_image)
-                    self.platforms.add(ptf)
-                    self.all_sprites.add(ptf)
-                    plf_coords.append((col, row))
-
-                elif tile == 'p':
-                    self.player = Player(self, col, row, 1, 2, self.player_animations)
-                    self.all_sprites.add(self.player)
-
-                elif tile == 'c':
-                    caterpillar = Caterpillar(self, col, row, 1, 1, self.ctpll_animations)
-                    self.enemies.add(caterpillar)
-                    self.all_sprites.add(caterpillar)
-
-                elif tile == 'b':
-                    bird = Bird(self, col, row, 1, 1, self.bird_animations)
-                    self.enemies.add(bird)
-                    self.all_sprites.add(bird)
-
-                elif tile == 's':
-                    spider = Spider(self, col, row, 1, 1, self.spider_animations)
-                    self.enemies.add(spider)
-                    self.all_sprites.add(spider)
-
-        # generate pickups at random locations along platforms
-        random.shuffle(plf_coords)
-        for i in range(1, 100):  # 100 pickups
-            col = plf_coords[i][0]
-            row = plf_coords[i][1] - 1  # move pick_up on top of platform
-            image = self.pick_up_images[i % 32]  # cycle through 32 available images for pick ups (reset to first image after 32nd)
-
-            if i % 50 == 0:  # generate speedboost every 50 iterations
-                pick_up = Speedboost(plf_coords[i][0], plf_coords[i][1] - 2, self.speedboost_image)
-            elif i % 51 == 0:  # generate jumpboost every 51 iterations
-                pick_up = Jumpboost(plf_coords[i+1][0], plf_coords[i+1][1] - 2, self.jumpboost_image)
-            else:
-                pick_up = Pick_up(col, row, image)  # standard pickup which increase points tally
-
-            self.pick_ups.add(pick_up)
-            self.all_sprites.add(pick_up)
-
-        self.run()
+        self.missile_pool = MissilePool(self)  # missiles are reused rather than created per shot
+        self.grid = TileGrid(self.map.cols, self.map.rows)  # platform and pick up lookup by map cell
+        self.broadphase = SpatialHash()  # enemy lookup for the player's and missiles' collision checks
+        self.enemy_engine = None
+        self.scheduler = UpdateScheduler(self) if self.use_scheduler else None
+        self.navigation = Navigation(self.grid)  # distance fields leading enemies to the player
+
+        if self.map.streamed:
+            # chunked map: only the chunks around the camera are turned into sprites, as the player moves
+            self.static_layer = StaticLayer(self.pltf_image)
+            self.streamer = MapStreamer(self)
+            self.streamer.start()
+        else:
+            self.streamer = None
+            self.static_layer = StaticLayer(self.pltf_image, self.map)  # all platform tiles baked onto chunk surfaces
+
+            # the player goes first so it is updated before any enemy, whichever way enemies are updated- they
+            # all chase where the player is after this tick's move, as the enemy engine's do
+            for row, tiles in enumerate(self.map.data):
+                if 'p' in tiles:
+                    self.spawn_tile('p', tiles.index('p'), row)
+                    break
+
+            # load map data from map.txt file: create platform, enemy sprites accordingly
+            for row, tiles in enumerate(self.map.data):
+                for col, tile in enumerate(tiles):
+                    if tile != 'p':
+                        self.spawn_tile(tile, col, row)
+                    if tile == '1':
+                        plf_coords.append((col, row))
+
+            # generate pickups at random locations along platforms
+            self.random.shuffle(plf_coords)
+            for i in range(1, min(self.pick_up_count, len(plf_coords) - 1)):  # 100 pickups by default
+                col = plf_coords[i][0]
+                row = plf_coords[i][1] - 1  # move pick_up on top of platform
+                image = self.pick_up_images[i % 32]  # cycle through 32 available images for pick ups (reset to first image after 32nd)
+
+                if i % 50 == 0:  # generate speedboost every 50 iterations
+                    pick_up = Speedboost(plf_coords[i][0], plf_coords[i][1] - 2, self.speedboost_image)
+                elif i % 51 == 0:  # generate jumpboost every 51 iterations
+                    pick_up = Jumpboost(plf_coords[i+1][0], plf_coords[i+1][1] - 2, self.jumpboost_image)
+                else:
+                    pick_up = Pick_up(col, row, image)  # standard pickup which increase points tally
+
+                self.add_pick_up(pick_up)
+            self.camera.update(self.player)  # the first tick's scheduler and navigation already see the start position
+
+        if self.use_enemy_engine:
+            self.enemy_engine = EnemyEngine(self)
+        self.frame_cache.save()  # frames of enemy types first spawned since the last save
+
+    def spawn_tile(self, tile, col, row):
+        """ Create the sprite for a single map tile and add it to the sprite groups.  Returns the sprite (None for '.')"""
+        if tile == '1':
+            ptf = Platform(col, row, self.pltf_image)
+            self.add_platform(ptf)
+            return ptf
+
+        elif tile == 'p':
+            self.player = Player(self, col, row, 1, 2, self.player_animations)
+            self.all_sprites.add(self.player)
+            if self.scheduler:
+                self.scheduler.add(self.player)
+            return self.player
+
+        enemy = self.make_enemy(tile, col, row)
+        if enemy is not None:
+            self.add_enemy(enemy)
+        return enemy
+
+    def make_enemy(self, tile, col, row):
+
+        if tile == 'c':
+            return Caterpillar(self, col, row, 1, 1, self.enemy_animations(tile))
+        elif tile == 'b':
+            return Bird(self, col, row, 1, 1, self.enemy_animations(tile))
+        elif tile == 's':
+            return Spider(self, col, row, 1, 1, self.enemy_animations(tile))
+
+    def add_enemy(self, enemy):
+
+        self.enemies.add(enemy)
+        if not self.use_enemy_engine:
+            self.all_sprites.add(enemy)
+            if self.scheduler:
+                self.scheduler.add(enemy)
+        elif self.enemy_engine:  # the engine updates enemies itself
+            self.enemy_engine.add(enemy)
+
+    def add_platform(self, platform):
+
+        self.platforms.add(platform)
+        self.all_sprites.add(platform)
+        self.grid.add_platform(platform)
+
+    def add_pick_up(self, pick_up):
+
+        self.pick_ups.add(pick_up)
+        self.all_sprites.add(pick_up)
+        self.grid.add_pick_up(pick_up)
 
     def events(self):
         # Game Loop - events
+        shoot = False
 
         for event in pygame.event.get():
             # check for closing window
@@ -220,72 +414,181 @@ class Game:
             if event.type == pygame.KEYDOWN:
 
                 if event.key == pygame.K_LCTRL:
-                    self.player.shoot()
+                    shoot = True
 
                 if event.key == pygame.K_q:
                     self.playing = False
 
+                if event.key == pygame.K_F3:
+                    self.profiler.toggle_overlay()
+
+        self.inputs = InputState.from_keyboard(shoot)
+
+    def step(self, inputs=NO_INPUT, dt=1 / FPS):
+        """ Advance the game by a single tick using the given InputState.  No events, frame cap or drawing, so
+            a headless game can be run as fast as the CPU allows.  Returns False once the game is over. """
+        if self.recorder:
+            self.recorder.record(inputs, dt)
+        self.dt = dt
+        self.elapsed_time += dt
+        self.inputs = inputs
+        if inputs.shoot:
+            self.player.shoot()
+        self.update()
+        return self.playing
+
     def update(self):
         # Game Loop - Update
-        self.animate(self.player)
-        for enemy in self.enemies:
-            self.animate(enemy)
-        for missile in self.missiles:
-            self.animate(missile)
-
-        self.all_sprites.update()
-        self.camera.update(self.player)  # change camera rect position so that centred on player rect
+        profiler = self.profiler
+        with profiler.phase("animate"):
+            self.animator.new_tick(self.elapsed_time)
+            if self.scheduler and not self.enemy_engine:
+                for sprite in self.scheduler.awake:  # player and enemies near the camera- sleeping enemies aren't drawn
+                    self.animator.animate(sprite)
+            else:
+                self.animator.animate(self.player)
+                for enemy in self.enemies:
+                    self.animator.animate(enemy)
+            for missile in self.missiles:
+                self.animator.animate(missile)
+
+        self.navigation.update(self.player)  # enemies path towards where the player is at the start of the tick
+        if self.scheduler and not self.enemy_engine:  # sleeping enemies are far from the player and every missile
+            self.broadphase.rebuild(self.scheduler.awake, skip=self.player)
+        else:
+            self.broadphase.rebuild(self.enemies)
+        if self.scheduler:
+            self.scheduler.update()  # player, missiles and enemies near the camera
+        else:
+            profiler.update_sprites(self.all_sprites)  # all_sprites.update(), timed per sprite class when profiling
+        if self.enemy_engine:
+            with profiler.phase("update enemy engine"):
+                self.enemy_engine.update()
+        with profiler.phase("update camera/stream"):
+            self.camera.update(self.player)  # change camera rect position so that centred on player rect
+            if self.streamer:
+                self.streamer.update()  # load/unload map chunks around the camera
+        if profiler.enabled:
+            profiler.count("sprites", len(self.all_sprites))
 
     def draw(self):
         # Game Loop - draw
-        pygame.display.set_caption("{:.2f}".format(self.clock.get_fps()))
-        # self.screen.fill(BLACK)
-        self.screen.blit(self.background, (0, 0))  # draw background
-        for sprite in self.platforms:  # draw platforms first
-            self.screen.blit(sprite.image, self.camera.apply(sprite))
-        for sprite in self.pick_ups:
-            self.screen.blit(sprite.image, self.camera.apply(sprite))
-
-        self.screen.blit(self.player.image, self.camera.apply(self.player))
-        for sprite in self.enemies:
-            self.screen.blit(sprite.image, self.camera.apply(sprite)) # draw enemies last
-
-        for sprite in self.missiles:
-            self.screen.blit(sprite.image, self.camera.apply(sprite))
-
-        self.draw_text(str(self.score), 22, WHITE, WIDTH / 2, 15)
-        self.draw_text(str(self.player.actionvar), 22, RED, WIDTH-50, 15)
-        self.draw_threads()
-
-        pygame.display.flip()
+        profiler = self.profiler
+        self.camera.reset_counts()
+        camera_at = self.camera.rect.topleft
+        interpolating = self.alpha < 1 and self.previous
+        if interpolating:  # draw the map part way between the last two ticks, as the sprites are
+            self.camera.move_to(*self.blend(self.previous_camera, camera_at))
+        with profiler.phase("draw background"):
+            if self.renderer:  # draw calls are recorded and only changed areas redrawn
+                self.renderer.begin(self.background, self.static_layer, self.camera)
+            else:
+                # self.screen.fill(BLACK)
+                self.background.draw(self.screen, self.camera)  # draw background
+                self.static_layer.draw(self.screen, self.camera)  # draw platforms first
+        with profiler.phase("draw pick ups"):
+            self.draw_sprites(self.pick_ups)
+        with profiler.phase("draw player"):
+            self.draw_sprites((self.player,))
+        with profiler.phase("draw enemies"):
+            self.draw_sprites(self.enemies)  # draw enemies last
+        with profiler.phase("draw missiles"):
+            self.draw_sprites(self.missiles)
+        self.frames_drawn += 1
+        if self.frames_drawn % FPS == 0:  # once a second is plenty for the title bar
+            pygame.display.set_caption("{:.2f}  drawn {} culled {}".format(self.clock.get_fps(), self.camera.drawn, self.camera.culled))
+
+        with profiler.phase("draw hud"):
+            self.draw_text(str(self.score), 22, WHITE, WIDTH / 2, 15)
+            self.draw_text(str(self.player.actionvar), 22, RED, WIDTH-50, 15)
+        with profiler.phase("draw threads"):
+            self.draw_threads()
+        profiler.count("blits", self.camera.drawn)
+        profiler.count("culled", self.camera.culled)
+        profiler.draw(self)
+
+        with profiler.phase("flip"):
+            if self.renderer:
+                self.renderer.end()
+            else:
+                pygame.display.flip()
+        if self.frames_drawn == 1:
+            self.mark_startup("first game frame")  # reported by benchmark.py, with the rest of startup_times
+        if interpolating:
+            self.camera.move_to(*camera_at)
+
+    def draw_sprites(self, sprites):
+
+        previous = self.previous if self.alpha < 1 else None
+        for sprite in sprites:
+            if self.camera.is_visible(sprite):  # skip sprites outside the viewport
+                position = self.camera.apply(sprite)
+                if previous:
+                    start = previous.get(sprite)
+                    if start is not None and abs(start[0] - sprite.rect.x) + abs(start[1] - sprite.rect.y) < TILESIZE:  # not respawned
+                        x, y = self.blend(start, sprite.rect.topleft)
+                        position.move_ip(x - sprite.rect.x, y - sprite.rect.y)
+                if self.renderer:
+                    self.renderer.blit(sprite, sprite.image, position)
+                else:
+                    self.screen.blit(sprite.image, position)
+
+    def blend(self, previous, current):
+        """ Point alpha of the way from previous to current (both (x, y))."""
+        return (round(previous[0] + (current[0] - previous[0]) * self.alpha),
+                round(previous[1] + (current[1] - previous[1]) * self.alpha))
+
+    def snapshot(self):
+        """ Remember where the camera and the moving sprites in view are before a tick, for draw() to interpolate from."""
+        view = self.camera.view
+        self.previous = {sprite: sprite.rect.topleft for group in ((self.player,), self.enemies, self.missiles)
+                         for sprite in group if view.colliderect(sprite.rect)}
+        self.previous_camera = self.camera.rect.topleft
 
     def draw_text(self, text, size, colour, x, y):
 
-        font = pygame.font.Font('freesansbold.ttf', size)  # text font
-        text_surface = font.render(text, True, colour)
-        text_rect = text_surface.get_rect()
-        text_rect.center = (x, y)
-        self.screen.blit(text_surface, text_rect)
+        if self.renderer and self.renderer.recording:
+            for i, (surface, position) in enumerate(self.text.layout(text, size, colour, x, y)):
+                self.renderer.blit(("text", x, y, i), surface, position)  # keyed by HUD slot
+        else:
+            self.text.draw(self.screen, text, size, colour, x, y)
 
     def draw_threads(self):
 
-        for coord_set in self.thread_coords:
-            x1 = coord_set[0][0] + self.camera.rect.x
-            y1 = coord_set[0][1] + self.camera.rect.y
-            x2 = coord_set[1][0] + self.camera.rect.x
-            y2 = coord_set[1][1] + self.camera.rect.y
-
-            pygame.draw.line(self.screen, WHITE, (x1, y1), (x2, y2))
+        for spider, start, end in self.threads.visible(self.camera):  # only threads crossing the screen
+            if self.renderer:
+                self.renderer.line(("thread", spider), WHITE, start, end)
+            else:
+                pygame.draw.line(self.screen, WHITE, start, end)
 
     def run(self):
-        # Game Loop
+        # Game Loop- fixed timestep: the game always advances in ticks of 1/FPS seconds, as many as the time since the
+        # last frame covers (frames are skipped when ticks fall behind), and frames are drawn between the last two ticks
         self.playing = True
+        tick = 1 / FPS
+        lag = 0  # game time not yet ticked, in seconds
+        shoot = False
         while self.playing:  # MAIN GAME LOOP
-            self.dt = self.clock.tick(FPS) / 1000  # seconds
-            self.elapsed_time += self.dt
-            self.events()
-            self.update()
+            lag += self.clock.tick(RENDER_FPS) / 1000  # seconds
+            self.profiler.start_frame()  # frame time excludes the wait in clock.tick
+            with self.profiler.phase("events"):
+                self.events()
+            shoot = shoot or self.inputs.shoot  # a shot fired between ticks is kept for the next one
+
+            ticks = min(int(lag / tick), MAX_FRAME_SKIP)
+            lag = min(lag - ticks * tick, tick)  # further behind than MAX_FRAME_SKIP ticks- slow down rather than catch up
+            for i in range(ticks):
+                if INTERPOLATE and i == ticks - 1:
+                    self.snapshot()
+                self.step(InputState(self.inputs.left, self.inputs.right, self.inputs.jump, shoot), tick)
+                shoot = False
+                if not self.playing:
+                    break
+            self.alpha = lag / tick if INTERPOLATE else 1
             self.draw()
+            self.profiler.end_frame()
+        self.alpha = 1
+        self.previous = {}
 
     def gameover(self):
         print("GameOver!")
@@ -302,6 +605,8 @@ class Game:
                 if event.type == pygame.KEYDOWN:
                     waiting = False
 
+            if self.loader is not None and not self.loader.is_alive():
+                self.finish_loading()  # convert and cut frames while the screen waits, not after the key press
             self.clock.tick(FPS)
 
     def show_start_screen(self):
@@ -312,6 +617,7 @@ class Game:
         self.draw_text("Press any key to continue", 22, RED, WIDTH/2, HEIGHT*3/4)
         self.draw_text("High Score: " + str(self.highscore), 22, RED, WIDTH/2, 15)
         pygame.display.flip()
+        self.mark_startup("first frame")
         self.wait_for_key()
 
     def show_gameover(self):
@@ -331,11 +637,14 @@ class Game:
         self.wait_for_key()
 
 
-g = Game()
-g.show_start_screen()
+if __name__ == "__main__":
+    map_file = sys.argv[1] if len(sys.argv) > 1 else 'map.txt'  # python Platformer.py endless: the endless level
+    g = Game(map_file=map_file, background_load=True)  # assets load while the start screen is shown
+    g.show_start_screen()
 
-while g.running:
-    g.new()
-    g.gameover()
+    while g.running:
+        g.new()
+        g.gameover()
 
-pygame.quit()
\ No newline at end of file
+    g.profiler.close()
+    pygame.quit()
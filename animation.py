@@ -0,0 +1,45 @@
+"""
+This module turns the loaded animation frame lists into precomputed clips, and works out which frame every
+animated sprite shows from the game clock.
+"""
+
+
+class Clip:
+    """ A single animation (e.g. player walk) resolved into flat frame tuples per direction.  period is the time
+        each frame is displayed for, so the frame shown t seconds into the clip is int(t / period) % count. """
+
+    def __init__(self, frames_r, frames_l, duration):
+        self.frames = {"R": tuple(frames_r), "L": tuple(frames_l)}
+        self.count = len(frames_r)
+        self.duration = duration  # seconds to play every frame once
+        self.period = duration / self.count
+
+
+def make_clips(animations):
+    """ {"walk": {"L": [...], "R": [...], "T": 0.5}} -> {"walk": Clip}.  Actions with no frames loaded are left out."""
+    return {action: Clip(anim["R"], anim["L"], anim["T"]) for action, anim in animations.items() if anim["R"]}
+
+
+class Animator:
+    """ Sets sprite.image from the clip for its current action.  Each sprite records when its action started
+        (anim_start); sprites sharing a clip and a start time (e.g. every caterpillar) share one frame calculation
+        per tick.  Frames are derived from the clock rather than counted, so a long tick can't skip or stall one. """
+
+    def __init__(self):
+        self.elapsed_time = 0
+        self.played = {}  # (clip, anim_start): frames played so far this tick
+
+    def new_tick(self, elapsed_time):
+        self.elapsed_time = elapsed_time
+        self.played.clear()
+
+    def animate(self, sprite):
+        clip = sprite.animations[sprite.actionvar]
+        key = (clip, sprite.anim_start)
+        played = self.played.get(key)
+        if played is None:
+            played = self.played[key] = int((self.elapsed_time - sprite.anim_start) / clip.period)
+
+        sprite.frames_played = played  # frames shown since the action started (not wrapped)
+        sprite.current_frame = played % clip.count
+        sprite.image = clip.frames[sprite.direction][sprite.current_frame]
@@ -0,0 +1,146 @@
+"""
+Runs many headless game sessions across a process pool and collects the results into a single report.
+Used to soak test level edits without playing them by hand.
+
+    python batch_runner.py --maps map.txt map_alt.txt --seeds 0-15 --ticks 3600 --report report.json
+
+Input scripts are strings of space separated steps, each step being the held controls followed by a tick count:
+L (left), R (right), J (jump), S (shoot on the first tick of the step) and . (nothing held).  "RJ20" holds right
+and jump for 20 ticks.  Scripts repeat until the session ends.
+"""
+import argparse
+import json
+import os
+import re
+import time
+from multiprocessing import Pool
+
+DEFAULT_SCRIPTS = ["R60 L60", "RJ20 R40 LJ20 L40", "RS1 R30 LS1 L30 J10 .20", ".1"]
+STEP_FORMAT = re.compile(r"^([LRJS.]+)(\d*)$")
+
+
+def parse_script(script):
+    """ Turn a script string into a list of (left, right, jump, shoot, ticks) steps."""
+    steps = []
+    for token in script.split():
+        match = STEP_FORMAT.match(token)
+        if match is None:
+            raise ValueError("bad input script step: {!r}".format(token))
+        keys, ticks = match.group(1), int(match.group(2) or 1)
+        steps.append(("L" in keys, "R" in keys, "J" in keys, "S" in keys, ticks))
+    if not steps:
+        raise ValueError("empty input script")
+    return steps
+
+
+def script_inputs(script):
+    """ Endless generator of InputState, one per tick, following the script."""
+    from inputs import InputState
+
+    steps = parse_script(script)
+    while True:
+        for left, right, jump, shoot, ticks in steps:
+            for tick in range(ticks):
+                yield InputState(left, right, jump, shoot and tick == 0)
+
+
+def run_session(session):
+    """ Play one headless session and return its results.  Runs in a worker process."""
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))  # images are loaded relative to the project folder
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    os.environ["SDL_NO_SIGNAL_HANDLERS"] = "1"  # SDL would otherwise swallow the SIGTERM used to shut the pool down
+    import pygame
+    from Platformer import Game
+
+    start = time.perf_counter()
+    game = Game(headless=True, map_file=session["map"], seed=session["seed"])
+    game.load_level()
+    load_time = time.perf_counter() - start
+
+    peak_enemies = peak_missiles = peak_sprites = 0
+    death_tick = None
+    inputs = script_inputs(session["script"])
+
+    start = time.perf_counter()
+    tick = 0
+    while tick < session["ticks"]:
+        tick += 1
+        alive = game.step(next(inputs))
+        peak_enemies = max(peak_enemies, len(game.enemies))
+        peak_missiles = max(peak_missiles, len(game.missiles))
+        peak_sprites = max(peak_sprites, len(game.all_sprites))
+        if not alive:
+            death_tick = tick
+            break
+    run_time = time.perf_counter() - start
+    pygame.quit()
+
+    result = dict(session)
+    result.update(score=game.score,
+                  death_tick=death_tick,
+                  ticks_run=tick,
+                  ticks_per_sec=round(tick / run_time, 1) if run_time else None,
+                  load_time=round(load_time, 4),
+                  peak_enemies=peak_enemies,
+                  peak_missiles=peak_missiles,
+                  peak_sprites=peak_sprites)
+    return result
+
+
+def parse_seeds(text):
+    """ "0-3,7" -> [0, 1, 2, 3, 7]"""
+    seeds = []
+    for part in text.split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            seeds.extend(range(int(first), int(last) + 1))
+        else:
+            seeds.append(int(part))
+    return seeds
+
+
+def run_batch(sessions, workers=None):
+    """ Spread sessions over a process pool (all cores by default) and return the report dict."""
+    start = time.perf_counter()
+    pool = Pool(workers or os.cpu_count())
+    try:
+        results = pool.map(run_session, sessions, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    wall_time = time.perf_counter() - start
+
+    deaths = [r for r in results if r["death_tick"] is not None]
+    return {"sessions": results,
+            "summary": {"sessions": len(results),
+                        "deaths": len(deaths),
+                        "mean_score": round(sum(r["score"] for r in results) / len(results), 1) if results else 0,
+                        "earliest_death_tick": min((r["death_tick"] for r in deaths), default=None),
+                        "total_ticks": sum(r["ticks_run"] for r in results),
+                        "wall_time": round(wall_time, 2)}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test levels with headless sessions on every core.")
+    parser.add_argument("--maps", nargs="+", default=["map.txt", "map_alt.txt"])
+    parser.add_argument("--seeds", default="0-3", help="seed list/ranges for pick up placement, e.g. 0-7,42")
+    parser.add_argument("--scripts", nargs="+", default=DEFAULT_SCRIPTS, help="input scripts (see module docstring)")
+    parser.add_argument("--ticks", type=int, default=3600, help="maximum ticks per session")
+    parser.add_argument("--workers", type=int, default=None, help="processes to use (default: all cores)")
+    parser.add_argument("--report", default="batch_report.json")
+    args = parser.parse_args()
+
+    for script in args.scripts:
+        parse_script(script)  # fail early on a typo rather than inside a worker
+
+    sessions = [{"map": map_file, "seed": seed, "script": script, "ticks": args.ticks}
+                for map_file in args.maps for seed in parse_seeds(args.seeds) for script in args.scripts]
+    report = run_batch(sessions, args.workers)
+
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report["summary"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Benchmark suite.  Generates synthetic maps (same text format as map.txt) at several scales, plays each one headless
+for a fixed number of ticks with a fixed seed and input script, and writes the results to a JSON file that can be
+compared against a saved baseline to catch regressions in sprites.py, Game.update or Game.draw.
+
+    python benchmark.py                                    run every scale, write benchmark.json
+    python benchmark.py --scales small huge --ticks 1200
+    python benchmark.py --save-baseline                    also copy the results to benchmark_baseline.json
+    python benchmark.py --baseline benchmark_baseline.json compare, exit code 1 on a regression
+
+Every run gets its own process so peak memory belongs to that scale alone.  Each scale is run --repeats times and
+the best value of each metric kept, which takes most of the noise out of the comparison.  After the timed ticks a
+few more are played under tracemalloc (it slows everything down) for the memory held by each enemy and the memory
+churned through per tick.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from multiprocessing import Pool
+
+try:
+    import resource  # peak memory (not available on Windows)
+except ImportError:
+    resource = None
+
+# name: map size in tiles, enemies of each type, pick ups per platform tile
+SCALES = {"small": {"cols": 32, "rows": 60, "c": 4, "b": 2, "s": 2, "pick_up_density": 0.33},
+          "medium": {"cols": 32, "rows": 240, "c": 20, "b": 8, "s": 8, "pick_up_density": 0.33},
+          "crowded": {"cols": 32, "rows": 40, "c": 60, "b": 20, "s": 20, "pick_up_density": 0.5},
+          "large": {"cols": 32, "rows": 1200, "c": 100, "b": 40, "s": 40, "pick_up_density": 0.33},
+          "huge": {"cols": 64, "rows": 4000, "c": 400, "b": 150, "s": 150, "pick_up_density": 0.33}}
+DEFAULT_SCALES = ["small", "medium", "crowded", "large"]
+SCRIPT = "R40 RJ20 R30 LS1 L40 LJ20 L30 RS1 .10"  # batch_runner input script format
+ENTITY_SAMPLE = 500  # enemies of each type built to measure the memory an enemy holds
+MEMORY_TICKS = 300  # ticks played under tracemalloc after the timed run
+# metric: (True if bigger is better, changes smaller than this are never flagged- timer noise)
+METRICS = {"ticks_per_sec": (True, 0),
+           "update_mean_ms": (False, 0.05),
+           "update_p99_ms": (False, 0.2),
+           "draw_mean_ms": (False, 0.05),
+           "draw_p99_ms": (False, 0.2),
+           "startup_time": (False, 0.01),
+           "first_frame_time": (False, 0.01),
+           "load_data_time": (False, 0.01),
+           "load_level_time": (False, 0.01),
+           "peak_memory_kb": (False, 1024),
+           "entity_bytes": (False, 16),
+           "tick_churn_bytes": (False, 256)}
+
+
+def generate_map(cols, rows, c, b, s, seed=0, **unused):
+    """ Rows of tile characters for a synthetic level: a solid floor, platforms every 3 rows, the player at the
+        bottom, caterpillars and spiders standing on platforms and birds in the air."""
+    rng = random.Random(seed)
+    tiles = [["."] * cols for row in range(rows)]
+    tiles[rows - 1] = ["1"] * cols  # floor
+    platform_rows = list(range(rows - 4, 1, -3))
+    for row in platform_rows:
+        col = rng.randrange(0, 4)
+        while col < cols:
+            length = rng.randint(3, 8)
+            for x in range(col, min(cols, col + length)):
+                tiles[row][x] = "1"
+            col += length + rng.randint(2, 6)
+
+    standing = [(col, row - 1) for row in platform_rows + [rows - 1] for col in range(cols)
+                if tiles[row][col] == "1" and tiles[row - 1][col] == "."]
+    flying = [(col, row) for row in range(rows - 2) for col in range(cols) if row not in platform_rows and tiles[row][col] == "."]
+    tiles[rows - 2][1] = "p"
+    standing = [cell for cell in standing if abs(cell[0] - 1) > 4 or cell[1] != rows - 2]  # not on top of the player
+
+    for tile, count, cells in (("c", c, standing), ("s", s, standing), ("b", b, flying)):
+        for col, row in rng.sample(cells, min(count, len(cells))):
+            if tiles[row][col] == ".":
+                tiles[row][col] = tile
+    return ["".join(row) for row in tiles]
+
+
+def write_map(filename, data):
+    with open(filename, "w") as f:
+        for row in data:
+            f.write("\t".join(row) + "\n")
+
+
+def percentile(values, point):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * point / 100))] if values else 0
+
+
+def entity_bytes(game, count=ENTITY_SAMPLE):
+    """ Memory held by each new enemy: its Python objects (tracemalloc) and the pixels of the surfaces it holds,
+        a surface shared between enemies counted once between them. """
+    from sprites import Caterpillar, Bird, Spider
+    types = [(enemy_type, game.enemy_animations(tile)) for tile, enemy_type in (("c", Caterpillar), ("b", Bird), ("s", Spider))]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    enemies = [enemy_type(game, 0, 0, 1, 1, animations) for enemy_type, animations in types for i in range(count)]
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    images = {id(enemy.image): enemy.image for enemy in enemies}
+    held += sum(image.get_pitch() * image.get_height() for image in images.values())
+    return held / len(enemies)
+
+
+def tick_churn(game, inputs, ticks=MEMORY_TICKS):
+    """ Mean bytes a tick allocates and frees again before it ends: the tracemalloc peak during the tick above what
+        is held at either end of it. """
+    churn = 0
+    tracemalloc.start()
+    for tick in range(ticks):
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        game.step(next(inputs))
+        end, peak = tracemalloc.get_traced_memory()
+        churn += peak - max(start, end)
+    tracemalloc.stop()
+    return churn / ticks
+
+
+def run_scale(job):
+    """ Generate and play one scale, returning its metrics.  Runs in a worker process."""
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    os.environ["SDL_NO_SIGNAL_HANDLERS"] = "1"
+    import pygame
+    from Platformer import Game
+    from batch_runner import script_inputs
+
+    class BenchGame(Game):
+        def load_data(self):
+            start = time.perf_counter()
+            super().load_data()
+            self.load_data_time = time.perf_counter() - start
+
+        def prepare_data(self):
+            start = time.perf_counter()
+            super().prepare_data()
+            self.load_data_time += time.perf_counter() - start
+
+    scale = SCALES[job["scale"]]
+    data = generate_map(seed=job["seed"], **scale)
+    platforms = sum(row.count("1") for row in data)
+    map_dir = tempfile.mkdtemp(prefix="platformer_bench_")
+    map_file = os.path.join(map_dir, job["scale"] + ".txt")
+    write_map(map_file, data)
+
+    try:
+        start = time.perf_counter()
+        game = BenchGame(headless=True, map_file=map_file, seed=job["seed"], pick_ups=int(platforms * scale["pick_up_density"]))
+        startup_time = time.perf_counter() - start
+        start = time.perf_counter()
+        game.load_level()
+        load_level_time = time.perf_counter() - start
+
+        sprites = len(game.all_sprites)
+        inputs = script_inputs(SCRIPT)
+        update_times = []
+        draw_times = []
+        clock = time.perf_counter
+        start = clock()
+        for tick in range(job["ticks"]):
+            tick_start = clock()
+            game.step(next(inputs))  # keeps running if the player dies, so every run is the same length
+            draw_start = clock()
+            game.draw()
+            update_times.append(draw_start - tick_start)
+            draw_times.append(clock() - draw_start)
+        run_time = clock() - start
+        churn_bytes = tick_churn(game, inputs)
+        held_bytes = entity_bytes(game)
+        pygame.quit()
+    finally:
+        shutil.rmtree(map_dir, ignore_errors=True)
+
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None  # KB on Linux
+    ms = 1000
+    return {"scale": job["scale"],
+            "tiles": scale["cols"] * scale["rows"],
+            "platforms": platforms,
+            "sprites": sprites,
+            "ticks": job["ticks"],
+            "ticks_per_sec": round(job["ticks"] / run_time, 1),
+            "update_mean_ms": round(sum(update_times) / len(update_times) * ms, 4),
+            "update_p99_ms": round(percentile(update_times, 99) * ms, 4),
+            "draw_mean_ms": round(sum(draw_times) / len(draw_times) * ms, 4),
+            "draw_p99_ms": round(percentile(draw_times, 99) * ms, 4),
+            "startup_time": round(startup_time, 4),
+            "first_frame_time": round(game.startup_times["first game frame"], 4),  # Game() to the first frame drawn
+            "load_data_time": round(game.load_data_time, 4),
+            "load_level_time": round(load_level_time, 4),
+            "peak_memory_kb": peak_memory,
+            "entity_bytes": round(held_bytes),
+            "tick_churn_bytes": round(churn_bytes)}
+
+
+def best_of(runs):
+    """ Merge repeated runs of a scale keeping the best value of each metric (least disturbed by other processes)."""
+    best = dict(runs[0])
+    for run in runs[1:]:
+        for metric, (higher_is_better, noise) in METRICS.items():
+            if run[metric] is not None:
+                best[metric] = (max if higher_is_better else min)(best[metric], run[metric])
+    best["repeats"] = len(runs)
+    return best
+
+
+def run_benchmarks(scales, ticks, seed=0, repeats=3):
+    # maxtasksperchild=1: a fresh process per run, so ru_maxrss isn't carried over from a bigger scale
+    pool = Pool(1, maxtasksperchild=1)
+    try:
+        jobs = [{"scale": scale, "ticks": ticks, "seed": seed} for scale in scales for repeat in range(repeats)]
+        runs = pool.map(run_scale, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    results = [best_of(runs[i:i + repeats]) for i in range(0, len(runs), repeats)]
+
+    import pygame
+    return {"meta": {"python": platform.python_version(),
+                     "pygame": pygame.version.ver,
+                     "platform": platform.platform(),
+                     "ticks": ticks,
+                     "seed": seed,
+                     "repeats": repeats,
+                     "script": SCRIPT,
+                     "time": time.strftime("%Y-%m-%d %H:%M:%S")},
+            "results": {result["scale"]: result for result in results}}
+
+
+def compare(report, baseline, tolerance):
+    """ Print each metric against the baseline.  Returns the list of (scale, metric) that got worse than tolerance."""
+    regressions = []
+    print("{:<10}{:<18}{:>12}{:>12}{:>9}".format("scale", "metric", "baseline", "now", "change"))
+    for scale, result in report["results"].items():
+        old = baseline["results"].get(scale)
+        if old is None:
+            continue
+        for metric, (higher_is_better, noise) in METRICS.items():
+            if not old.get(metric) or result.get(metric) is None:
+                continue
+            change = (result[metric] - old[metric]) / old[metric]
+            worse = -change if higher_is_better else change
+            flag = "  REGRESSION" if worse > tolerance and abs(result[metric] - old[metric]) > noise else ""
+            if flag:
+                regressions.append((scale, metric))
+            print("{:<10}{:<18}{:>12}{:>12}{:>8.1f}%{}".format(scale, metric, old[metric], result[metric], change * 100, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark headless play on synthetic maps.")
+    parser.add_argument("--scales", nargs="+", default=DEFAULT_SCALES, choices=sorted(SCALES))
+    parser.add_argument("--ticks", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=0, help="seed for map generation and pick up placement")
+    parser.add_argument("--repeats", type=int, default=3, help="runs per scale, the best of each metric is kept")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="copy the results to benchmark_baseline.json")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed slowdown before a metric is flagged (0.1 = 10%%)")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.scales, args.ticks, args.seed, args.repeats)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        shutil.copyfile(args.output, "benchmark_baseline.json")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance):
+            sys.exit(1)
+    else:
+        for scale, result in report["results"].items():
+            print("{:<10}{:>10} ticks/s  update {:.3f}/{:.3f} ms  draw {:.3f}/{:.3f} ms (mean/p99)".format(
+                scale, result["ticks_per_sec"], result["update_mean_ms"], result["update_p99_ms"],
+                result["draw_mean_ms"], result["draw_p99_ms"]))
+            print("{:<10}{:>10} bytes per enemy  {} bytes churned per tick".format("", result["entity_bytes"], result["tick_churn_bytes"]))
+
+
+if __name__ == "__main__":
+    main()
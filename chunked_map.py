@@ -0,0 +1,326 @@
+"""
+Chunked map format for very large levels, the endless procedurally generated level, and the streamer that turns
+chunks of either into sprites around the camera.
+
+A .chunks file holds the map as bands of MAP_CHUNK_ROWS full-width rows, each band zlib compressed separately and
+found through an offset table, so any band can be read without touching the rest of the file:
+
+    header      magic, version, cols, rows, chunk_rows, player col, player row, chunk count
+    offsets     (offset, length) of every compressed band
+    bands       tile characters, one byte per tile, row after row
+
+Convert an existing tab separated map with:
+
+    python chunked_map.py map.txt map.chunks
+
+Play the endless level with map file ENDLESS_MAP ("endless"): python Platformer.py endless
+"""
+import random
+import struct
+import sys
+import zlib
+from settings import *
+from sprites import Pick_up, Speedboost, Jumpboost, Caterpillar, Bird, Spider
+
+CHUNKED_MAP_EXT = ".chunks"
+MAGIC = b"PLTC"
+VERSION = 1
+HEADER = struct.Struct("<4sHIIIiiI")
+OFFSET = struct.Struct("<II")
+ENEMY_TILES = {Caterpillar: 'c', Bird: 'b', Spider: 's'}  # map character for each enemy type
+
+
+def read_text_map(filename):
+    """ Rows of tile characters from a tab separated .txt map (the same parsing as Map)."""
+    with open(filename, 'rt') as f:
+        return [line.replace("\t", '').strip() for line in f]
+
+
+def convert_map(text_file, chunk_file, chunk_rows=MAP_CHUNK_ROWS):
+    """ Write a .txt map out in the chunked format."""
+    data = read_text_map(text_file)
+    cols, rows = len(data[0]), len(data)
+    player = (-1, -1)
+    for row, tiles in enumerate(data):
+        if 'p' in tiles:
+            player = (tiles.index('p'), row)
+    data = [(tiles.replace('p', '.') + '.' * cols)[:cols] for tiles in data]  # player comes from the header instead
+
+    bands = []
+    for first_row in range(0, rows, chunk_rows):
+        bands.append(zlib.compress("".join(data[first_row:first_row + chunk_rows]).encode("ascii"), 9))
+
+    with open(chunk_file, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, cols, rows, chunk_rows, player[0], player[1], len(bands)))
+        offset = HEADER.size + OFFSET.size * len(bands)
+        for band in bands:
+            f.write(OFFSET.pack(offset, len(band)))
+            offset += len(band)
+        for band in bands:
+            f.write(band)
+
+
+class StreamedMap:
+    """ Same size attributes as Map, but tiles come a band (chunk) of rows at a time from read_chunk(), made by
+        the subclass's make_chunk(index).  The streamer has chunks made a tick at a time ahead of the camera
+        (make_ahead()), so crossing into a chunk doesn't wait for it to be read or generated. """
+
+    streamed = True
+
+    def __init__(self):
+        self.ahead = {}  # chunk index: rows of tile characters made before they were needed
+
+    def new_level(self, seed):
+        """ Called as each game starts, with the seed its layout is made from."""
+        self.ahead = {}
+
+    def read_chunk(self, index):
+        """ Rows of tile characters in band index."""
+        tiles = self.ahead.pop(index, None)
+        return tiles if tiles is not None else self.make_chunk(index)
+
+    def make_ahead(self, index):
+        self.ahead[index] = self.make_chunk(index)
+
+    def drop_ahead(self, first, last):
+        """ Forget chunks made ahead that are no longer between first and last."""
+        for index in [index for index in self.ahead if not first <= index <= last]:
+            del self.ahead[index]
+
+
+class ChunkedMap(StreamedMap):
+    """ A .chunks file, each band read and decompressed only when the streamer asks for it.  The file is opened
+        for each read rather than held open, so nothing needs closing when the map (or the game) goes. """
+
+    remember = None  # chunks away from the camera whose pick ups and enemies are remembered (None: all of them)
+
+    def __init__(self, filename):
+        super().__init__()
+        self.filename = filename
+        with open(filename, "rb") as f:
+            magic, version, self.cols, self.rows, self.chunk_rows, player_col, player_row, count = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("{} is not a version {} chunked map".format(filename, VERSION))
+            self.offsets = [OFFSET.unpack(f.read(OFFSET.size)) for i in range(count)]
+        self.player_start = (player_col, player_row)
+        self.chunk_count = count
+        self.width = self.cols * TILESIZE  # pixel width of the map
+        self.height = self.rows * TILESIZE
+
+    def make_chunk(self, index):
+        offset, length = self.offsets[index]
+        with open(self.filename, "rb") as f:  # a chunk is read a tick ahead of need, so the open costs no frame
+            f.seek(offset)
+            data = f.read(length)
+        tiles = zlib.decompress(data).decode("ascii")
+        return [tiles[i:i + self.cols] for i in range(0, len(tiles), self.cols)]
+
+
+class EndlessMap(StreamedMap):
+    """ A level generated a chunk at a time as the player climbs, from the floor up to ENDLESS_CHUNKS chunks above
+        it (more than a player will ever climb).  Each chunk is made from the level seed and its index alone, so
+        a chunk dropped far behind the player and met again comes back the same, and a replay rebuilds the level.
+        Platform rows every ENDLESS_ROW_SPACING rows, with more enemies the higher the chunk. """
+
+    remember = ENDLESS_REMEMBER
+
+    def __init__(self, seed=None):
+        super().__init__()
+        self.cols = WIDTH // TILESIZE
+        self.chunk_rows = MAP_CHUNK_ROWS
+        self.chunk_count = ENDLESS_CHUNKS
+        self.rows = self.chunk_count * self.chunk_rows
+        self.player_start = (1, self.rows - 2)  # on the floor
+        self.width = self.cols * TILESIZE  # pixel width of the map
+        self.height = self.rows * TILESIZE
+        self.new_level(seed)
+
+    def new_level(self, seed):
+        super().new_level(seed)
+        self.seed = seed if seed is not None else random.getrandbits(32)
+
+    def make_chunk(self, index):
+        rng = random.Random("{}:{}".format(self.seed, index))
+        first_row = index * self.chunk_rows
+        tiles = []
+        for row in range(first_row, first_row + self.chunk_rows):
+            cells = ["."] * self.cols
+            if row == self.rows - 1:
+                cells = ["1"] * self.cols  # floor
+            elif (self.rows - 1 - row) % ENDLESS_ROW_SPACING == 0:
+                col = rng.randrange(0, 4)
+                while col < self.cols:
+                    length = rng.randint(*ENDLESS_PLATFORM_LENGTH)
+                    cells[col:col + length] = ["1"] * len(cells[col:col + length])
+                    col += length + rng.randint(*ENDLESS_GAP)
+            tiles.append(cells)
+
+        climbed = self.chunk_count - 1 - index  # chunks above the starting one (which has no enemies)
+        if climbed:
+            standing = [(col, row) for row in range(self.chunk_rows - 1) for col in range(self.cols)
+                        if tiles[row][col] == "." and tiles[row + 1][col] == "1"]
+            flying = [(col, row) for row in range(self.chunk_rows) for col in range(self.cols)
+                      if "1" not in tiles[row]]
+            for i in range(min(ENDLESS_MAX_ENEMIES, ENDLESS_ENEMIES + climbed // ENDLESS_ENEMY_RAMP)):
+                tile = rng.choice(ENDLESS_ENEMY_MIX)
+                cells = flying if tile == "b" else standing
+                if cells:
+                    col, row = cells.pop(rng.randrange(len(cells)))
+                    tiles[row][col] = tile
+        return ["".join(cells) for cells in tiles]
+
+
+class MapStreamer:
+    """ Keeps the chunks within STREAM_MARGIN chunks of the camera loaded as sprites and unloads the rest.
+        Pick ups and enemies left in a chunk when it unloads are remembered, so collected pick ups and killed
+        enemies stay gone and enemies reappear where they were left (on endless maps only for chunks near the
+        camera).  Platform sprites of unloaded chunks are reused for the next chunks loaded. """
+
+    def __init__(self, game):
+        self.game = game
+        self.map = game.map
+        self.loaded = {}  # chunk index: platform sprites created for it
+        self.visited = set()  # chunks whose enemies and pick ups have been spawned from the file
+        self.saved = {}  # chunk index: (pick ups, enemy states) left there when it was unloaded
+        self.window = None  # (first, last) chunk indices currently wanted
+        self.spare_platforms = []  # platform sprites of unloaded chunks, reused for the next chunk loaded
+
+    def start(self):
+        self.map.new_level(self.game.level_seed)
+        col, row = self.map.player_start
+        self.game.spawn_tile('p', col, row)
+        self.game.camera.update(self.game.player)
+        self.update()
+
+    def chunk_of(self, y):
+        return int(y // (self.map.chunk_rows * TILESIZE))
+
+    def update(self):
+        camera = self.game.camera.rect
+        first = max(0, self.chunk_of(-camera.y) - STREAM_MARGIN)
+        last = min(self.map.chunk_count - 1, self.chunk_of(-camera.y + HEIGHT - 1) + STREAM_MARGIN)
+        if (first, last) == self.window:
+            self.make_ahead(first, last)
+            return
+        self.window = (first, last)
+
+        for index in range(first, last + 1):
+            if index not in self.loaded:
+                self.load_chunk(index)
+        for index in list(self.loaded):
+            if index < first - 1 or index > last + 1:  # one chunk of slack so the edge doesn't thrash
+                self.unload_chunk(index)
+        self.park_strays()
+        self.map.drop_ahead(first - STREAM_LOOKAHEAD, last + STREAM_LOOKAHEAD)
+        if self.map.remember is not None:
+            self.forget(first - 1 - self.map.remember, last + 1 + self.map.remember)
+
+    def make_ahead(self, first, last):
+        """ Make the nearest chunk within STREAM_LOOKAHEAD of the loaded ones that isn't made yet- one a tick, so
+            the chunks the camera moves into next are ready without ever making several in one frame. """
+        for distance in range(1, STREAM_LOOKAHEAD + 1):
+            for index in (first - distance, last + distance):  # above (where the player is climbing) first
+                if 0 <= index < self.map.chunk_count and index not in self.loaded and index not in self.map.ahead:
+                    self.map.make_ahead(index)
+                    return
+
+    def forget(self, first, last):
+        """ Drop what is remembered of chunks outside first to last, so memory stays the same however far the
+            player goes.  They are made afresh (new enemies and pick ups) if the player ever gets back to them. """
+        for index in [index for index in self.saved if not first <= index <= last]:
+            del self.saved[index]
+        self.visited = {index for index in self.visited if first <= index <= last or index in self.loaded}
+
+    def load_chunk(self, index):
+        game = self.game
+        first_row = index * self.map.chunk_rows
+        first_visit = index not in self.visited
+        platforms = []
+        for row_offset, tiles in enumerate(self.map.read_chunk(index)):
+            row = first_row + row_offset
+            for col, tile in enumerate(tiles):
+                if tile == '1':
+                    platforms.append(self.place_platform(col, row))
+                    game.static_layer.add_tile(col, row)
+                elif tile in ENEMY_TILES.values() and first_visit:
+                    game.spawn_tile(tile, col, row)
+        self.loaded[index] = platforms
+        self.visited.add(index)
+
+        if first_visit:
+            self.spawn_pick_ups(index, platforms)
+        pick_ups, enemies = self.saved.pop(index, ((), ()))  # restore whatever was left behind last time
+        for pick_up in pick_ups:
+            game.add_pick_up(pick_up)
+        for tile, state in enemies:
+            self.restore_enemy(tile, state)
+
+    def place_platform(self, col, row):
+        """ Platform sprite for map cell (col, row), reusing one from an unloaded chunk when there is one."""
+        if not self.spare_platforms:
+            return self.game.spawn_tile('1', col, row)
+        platform = self.spare_platforms.pop()
+        platform.pos.update(col * TILESIZE, row * TILESIZE)
+        platform.rect.topleft = platform.pos
+        self.game.add_platform(platform)
+        return platform
+
+    def spawn_pick_ups(self, index, platforms):
+        """ Scatter pick ups over the chunk's platforms, at roughly the density of the hand made maps."""
+        game = self.game
+        rng = game.random
+        count = int(len(platforms) * PICK_UP_DENSITY)
+        for i, platform in enumerate(rng.sample(platforms, count)):
+            col, row = platform.rect.x // TILESIZE, platform.rect.y // TILESIZE
+            serial = index * 100 + i + 1  # same boost spacing rule as the .txt maps
+            if serial % 50 == 0:
+                pick_up = Speedboost(col, row - 2, game.speedboost_image)
+            elif serial % 51 == 0:
+                pick_up = Jumpboost(col, row - 2, game.jumpboost_image)
+            else:
+                pick_up = Pick_up(col, row - 1, game.pick_up_images[serial % 32])
+            game.add_pick_up(pick_up)
+
+    def unload_chunk(self, index):
+        game = self.game
+        for platform in self.loaded.pop(index):
+            game.grid.remove_platform(platform)
+            platform.kill()
+            self.spare_platforms.append(platform)
+        game.static_layer.remove_rows(index * self.map.chunk_rows, (index + 1) * self.map.chunk_rows - 1)
+
+        saved_pick_ups = self.saved.setdefault(index, ([], []))[0]
+        for pick_up in [p for p in game.pick_ups if self.chunk_of(p.rect.bottom) == index]:  # chunk of the platform underneath
+            game.grid.remove_pick_up(pick_up)
+            pick_up.kill()
+            saved_pick_ups.append(pick_up)
+
+    def park_strays(self):
+        """ Put to sleep any enemy that has wandered into (or been left in) a chunk that isn't loaded."""
+        game = self.game
+        if game.enemy_engine:
+            game.enemy_engine.sync_all()  # off screen enemies only have up to date positions in the engine
+        for enemy in list(game.enemies):
+            index = min(max(self.chunk_of(enemy.pos.y - 1), 0), self.map.chunk_count - 1)
+            if index not in self.loaded:
+                state = (enemy.pos.x, enemy.pos.y, enemy.vel.x, enemy.vel.y, enemy.direction)
+                self.saved.setdefault(index, ([], []))[1].append((ENEMY_TILES[type(enemy)], state))
+                enemy.kill()
+                if game.scheduler:
+                    game.scheduler.discard(enemy)
+
+    def restore_enemy(self, tile, state):
+        enemy = self.game.make_enemy(tile, 0, 0)
+        x, y, vel_x, vel_y, direction = state
+        enemy.pos.update(x, y)
+        enemy.vel.update(vel_x, vel_y)
+        enemy.direction = direction
+        enemy.rect.midbottom = enemy.pos
+        self.game.add_enemy(enemy)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("usage: python chunked_map.py map.txt map.chunks")
+        sys.exit(1)
+    convert_map(sys.argv[1], sys.argv[2])
@@ -0,0 +1,145 @@
+"""
+This module holds the tile grid index used for sprite vs platform and sprite vs pick up collisions.
+"""
+from collections import deque
+from settings import *
+
+
+class TileGrid:
+    """ Spatial index of static tiles keyed by (col, row) map cell.  Platforms and pick ups never move, so a
+        collision check only needs to read the handful of cells underneath a sprite's rect instead of
+        testing the whole sprite group. """
+
+    def __init__(self, cols, rows):
+        self.cols = cols  # map size in tiles
+        self.rows = rows
+        self.platforms = {}  # (col, row): platform sprite occupying that cell
+        self.pick_ups = {}  # (col, row): list of pick ups overlapping that cell (boost pick ups span 2x2 cells)
+        self.version = 0  # bumped whenever a platform is added or removed (streamed maps)
+        self.changed_rows = deque(maxlen=NAV_CHANGE_LOG)  # row of each platform added or removed, the latest last
+
+    def cells(self, rect):
+        """ Return (col, row) of every map cell overlapped by rect, in row-major order."""
+        if rect.width <= 0 or rect.height <= 0:
+            return []
+        col_min = max(0, rect.left // TILESIZE)
+        col_max = min(self.cols - 1, (rect.right - 1) // TILESIZE)
+        row_min = max(0, rect.top // TILESIZE)
+        row_max = min(self.rows - 1, (rect.bottom - 1) // TILESIZE)
+        return [(col, row) for row in range(row_min, row_max + 1) for col in range(col_min, col_max + 1)]
+
+    def add_platform(self, platform):
+        self.platforms[(platform.rect.x // TILESIZE, platform.rect.y // TILESIZE)] = platform
+        self.platforms_changed(platform.rect.y // TILESIZE)
+
+    def remove_platform(self, platform):
+        self.platforms.pop((platform.rect.x // TILESIZE, platform.rect.y // TILESIZE), None)
+        self.platforms_changed(platform.rect.y // TILESIZE)
+
+    def platforms_changed(self, row):
+        self.version += 1
+        self.changed_rows.append(row)
+
+    def rows_changed_since(self, version):
+        """ (first, last) rows of the platforms added or removed since version, or None if there were more changes
+            since than are remembered. """
+        count = self.version - version
+        if count > len(self.changed_rows):
+            return None
+        rows = list(self.changed_rows)[len(self.changed_rows) - count:]
+        return (min(rows), max(rows)) if rows else None
+
+    def add_pick_up(self, pick_up):
+        for cell in self.cells(pick_up.rect):
+            self.pick_ups.setdefault(cell, []).append(pick_up)
+
+    def remove_pick_up(self, pick_up):
+        for cell in self.cells(pick_up.rect):
+            occupants = self.pick_ups.get(cell)
+            if occupants and pick_up in occupants:
+                occupants.remove(pick_up)
+                if not occupants:
+                    del self.pick_ups[cell]
+
+    def platforms_hit(self, rect):
+        """ Platforms colliding with rect.  Platform tiles fill their cell exactly, so any overlapped cell
+            holding a platform is a hit. """
+        platforms = self.platforms
+        return [platforms[cell] for cell in self.cells(rect) if cell in platforms]
+
+    def landing(self, left, width, bottom, dx, dy):
+        """ Top edge of the first platform a rect (left edge, width, bottom edge) falling dy pixels while moving dx
+            across lands on, or None.  Every row whose top edge the bottom of the rect crosses on the way is checked
+            at the columns the rect spans as it gets there, so no speed can carry a sprite through a platform. """
+        if dy <= 0:
+            return None
+        platforms = self.platforms
+        row = int(-(-bottom // TILESIZE))  # first row with its top edge at or below the rect's bottom
+        last_row = int((bottom + dy) // TILESIZE)
+        while row <= last_row:
+            top = row * TILESIZE
+            x = left + dx * (top - bottom) / dy  # rect's left edge as its bottom reaches top
+            for col in range(int(x // TILESIZE), int((x + width - 1) // TILESIZE) + 1):
+                if (col, row) in platforms:
+                    return top
+            row += 1
+        return None
+
+    def pick_ups_near(self, rect):
+        """ Pick ups whose rect shares a cell with rect (broad phase only- caller does the exact test)."""
+        found = []
+        for cell in self.cells(rect):
+            for pick_up in self.pick_ups.get(cell, ()):
+                if pick_up not in found:
+                    found.append(pick_up)
+        return found
+
+
+class SpatialHash:
+    """ Broad phase for moving sprites (enemies) hit by other moving sprites (player, missiles).  Rebuilt once a
+        tick by dropping each sprite into the cell holding its rect's top left corner, so building costs one dict
+        append per sprite and a query only reads the few cells around the query rect.  Sprites must be no bigger
+        than a cell, and may move up to margin pixels after the rebuild and still be found. """
+
+    def __init__(self, cell_size=BROADPHASE_CELL, margin=BROADPHASE_MARGIN):
+        self.cell_size = cell_size
+        self.margin = margin
+        self.cells = {}  # (col, row): [(n, sprite)] for sprites whose top left corner is in that cell
+
+    def rebuild(self, sprites, skip=None):
+        """ Index sprites (skipping skip).  n counts sprites in the order given, so hits come out in group
+            order, as spritecollide() would return them. """
+        size = self.cell_size
+        cells = self.cells = {}
+        for entry in enumerate(sprites):
+            sprite = entry[1]
+            if sprite is skip:
+                continue
+            rect = sprite.rect
+            key = (rect.x // size, rect.y // size)
+            bucket = cells.get(key)
+            if bucket is None:
+                cells[key] = [entry]
+            else:
+                bucket.append(entry)
+
+    def query(self, rect):
+        """ Sprites that may overlap rect (broad phase only- caller does the exact test), in rebuild order."""
+        size = self.cell_size
+        margin = self.margin
+        first_col, last_col = (rect.left - size - margin) // size, (rect.right + margin) // size
+        first_row, last_row = (rect.top - size - margin) // size, (rect.bottom + margin) // size
+        cells = self.cells
+        found = []
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                bucket = cells.get((col, row))
+                if bucket:
+                    found += bucket
+        if len(found) > 1:
+            found.sort()
+        return [sprite for n, sprite in found]
+
+    def hits(self, sprite, collided):
+        """ Live sprites colliding with sprite according to collided(sprite, other), like spritecollide()."""
+        return [other for other in self.query(sprite.rect) if other.alive() and collided(sprite, other)]
@@ -0,0 +1,281 @@
+"""
+Optional batched enemy update.  Enemy positions, velocities and states are held in NumPy arrays (one batch per
+enemy type) so chase, patrol and climb behaviour is computed for every enemy of a type in a handful of array
+operations instead of one Python update() per sprite.  Rects are only synced back for enemies near the camera,
+since off-screen enemies can't be drawn or hit.
+
+Requires numpy- check ENGINE_AVAILABLE before creating an EnemyEngine.
+"""
+from settings import *
+from sprites import Caterpillar, Bird, Spider
+
+try:
+    import numpy as np
+    ENGINE_AVAILABLE = True
+except ImportError:
+    np = None
+    ENGINE_AVAILABLE = False
+
+
+class EnemyBatch:
+    """ Structure of arrays for all enemies of one type.  Row i of each array belongs to self.sprites[i].  Subclasses
+        move their enemies a tick in step()."""
+
+    def __init__(self, engine, sprites):
+        self.engine = engine
+        self.game = engine.game
+        self.sprites = list(sprites)
+        self.pos = np.array([(s.pos.x, s.pos.y) for s in self.sprites], dtype=float).reshape(-1, 2)
+        self.vel = np.array([(s.vel.x, s.vel.y) for s in self.sprites], dtype=float).reshape(-1, 2)
+        self.width = self.sprites[0].rect.width if self.sprites else TILESIZE  # all enemies of a type share a size
+        self.height = self.sprites[0].rect.height if self.sprites else TILESIZE
+        self.left = np.array([s.rect.left for s in self.sprites], dtype=int)  # rect edges as of the last tick
+        self.bottom = np.array([s.rect.bottom for s in self.sprites], dtype=int)
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def extend(self, sprites):
+        """ Append rows for newly spawned enemies (streamed maps)."""
+        other = type(self)(self.engine, sprites)
+        for name, value in list(vars(self).items()):
+            if isinstance(value, np.ndarray):
+                setattr(self, name, np.concatenate((value, getattr(other, name))))
+        self.sprites.extend(other.sprites)
+
+    def compact(self):
+        """ Drop rows for enemies killed since the last tick."""
+        keep = np.array([s.alive() for s in self.sprites], dtype=bool)
+        if keep.all():
+            return
+        self.sprites = [s for s, k in zip(self.sprites, keep) if k]
+        for name, value in list(vars(self).items()):
+            if isinstance(value, np.ndarray) and len(value) == len(keep):
+                setattr(self, name, value[keep])
+
+    def rect_edges(self, dx=0, dy=0):
+        """ (left, top, right, bottom) pixel edges of every enemy rect, offset by dx, dy."""
+        left = self.left + dx
+        bottom = self.bottom + dy
+        return left, bottom - self.height, left + self.width, bottom
+
+    def move(self, swept=True):
+        """ pos += vel, stopping falling enemies on the first platform top crossed as Mobile_sprite.move() does
+            (unless not swept- birds fly through platforms), then place the rects as rect.midbottom = pos would
+            (pygame rounds half away from zero). """
+        step = self.vel
+        falling = np.flatnonzero(self.vel[:, 1] > 0) if swept else ()
+        if len(falling):
+            top = self.landing(falling)
+            landed = falling[~np.isnan(top)]
+            step = self.vel.copy()
+            step[landed, 1] = top[~np.isnan(top)] - self.pos[landed, 1]
+        self.pos += step
+        x, y = self.pos[:, 0], self.pos[:, 1]
+        self.left = np.trunc(x + np.copysign(0.5, x)).astype(int) - self.width // 2
+        self.bottom = np.trunc(y + np.copysign(0.5, y)).astype(int)
+
+    def landing(self, rows):
+        """ Vectorised TileGrid.landing() for the given rows: top edge of the platform each lands on, or nan."""
+        left = self.left[rows]
+        bottom = self.pos[rows, 1]
+        dx, dy = self.vel[rows, 0], self.vel[rows, 1]
+        row = -(-bottom // TILESIZE)  # first row with its top edge at or below the rect's bottom
+        last_row = (bottom + dy) // TILESIZE
+        landed = np.full(len(rows), np.nan)
+        for _ in range(int((last_row - row).max()) + 1):  # one pass per row crossed by the fastest faller
+            top = row * TILESIZE
+            x = left + dx * (top - bottom) / dy  # rect's left edge as its bottom reaches top
+            col_a, col_b = (x // TILESIZE).astype(int), ((x + self.width - 1) // TILESIZE).astype(int)
+            cell_row = row.astype(int)
+            hit = np.isnan(landed) & (row <= last_row) & (self.solid_at(cell_row, col_a) | self.solid_at(cell_row, col_b))
+            landed[hit] = top[hit]
+            row = row + 1
+        return landed
+
+    def solid_at(self, row, col):
+        """ Mask of (row, col) cells holding a platform (cells off the map are empty)."""
+        solid = self.engine.solid
+        rows, cols = solid.shape
+        row = row - self.engine.first_row
+        inside = (row >= 0) & (row < rows) & (col >= 0) & (col < cols)
+        return inside & solid[np.clip(row, 0, rows - 1), np.clip(col, 0, cols - 1)]
+
+    def land(self, dx=0):
+        """ Vectorised Mobile_sprite.collide_platforms: returns a mask of enemies standing on a platform (rect moved
+            a pixel down, and dx across) and snaps their pos.y to the platform top."""
+        left, top, right, bottom = self.rect_edges(dx, 1)
+        solid_at = self.solid_at
+        col_a, col_b = left // TILESIZE, (right - 1) // TILESIZE
+        row_a, row_b = top // TILESIZE, (bottom - 1) // TILESIZE
+        hit_a = solid_at(row_a, col_a) | solid_at(row_a, col_b)  # upper row of cells under the rect
+        hit_b = (row_b != row_a) & (solid_at(row_b, col_a) | solid_at(row_b, col_b))
+        hit_row = np.where(hit_a, row_a, row_b)
+        landed = (hit_a | hit_b) & (self.vel[:, 1] >= 0) & (self.pos[:, 1] < (hit_row + 1) * TILESIZE)
+        self.pos[landed, 1] = hit_row[landed] * TILESIZE
+        return landed
+
+    def steps_from(self, field, x, y, ahead=1):
+        """ Vectorised cell_at() of the points (x, y), and the field's step_from() each of those cells as a
+            (cols, rows) pair of arrays- a cell with no step (the target, or no way there) is its own step. """
+        cells = np.floor_divide(x, TILESIZE).astype(int), np.floor_divide(y - 1, TILESIZE).astype(int)
+        steps = field.steps_from(list(zip(cells[0].tolist(), cells[1].tolist())), ahead)
+        steps = np.array(steps, dtype=int).reshape(-1, 2)
+        return cells, (steps[:, 0], steps[:, 1])
+
+    def sync(self, view=None):
+        """ Copy array state back onto the sprites whose rect falls inside the camera view (all of them if view is None)."""
+        if view is None:
+            rows = range(len(self.sprites))
+        else:
+            left, top, right, bottom = self.rect_edges()
+            rows = np.flatnonzero((right > view.left) & (left < view.right) & (bottom > view.top) & (top < view.bottom))
+        for i in rows:
+            sprite = self.sprites[i]
+            sprite.pos.update(self.pos[i, 0], self.pos[i, 1])
+            sprite.vel.update(self.vel[i, 0], self.vel[i, 1])
+            sprite.rect.midbottom = (self.left[i] + self.width // 2, self.bottom[i])
+            self.sync_state(sprite, i)
+
+    def sync_state(self, sprite, i):
+        if self.vel[i, 0] > 0:
+            sprite.direction = "R"
+        elif self.vel[i, 0] < 0:
+            sprite.direction = "L"
+
+
+class CaterpillarBatch(EnemyBatch):
+
+    def step(self):
+        # patrol: turn around when there is no platform one body width ahead
+        d = np.sign(self.vel[:, 0]).astype(int)
+        ahead = self.land(dx=self.width * d)
+        self.vel[~ahead, 0] *= -1
+        self.move()
+
+    def sync_state(self, sprite, i):
+        sprite.direction = "R" if self.vel[i, 0] > 0 else "L"
+
+
+class BirdBatch(EnemyBatch):
+
+    def step(self):
+        player = self.game.player
+        chasing = np.abs(player.pos.y - self.pos[:, 1]) < HEIGHT  # within a screen height of the player
+        self.vel[~chasing] = 0
+
+        # steer along the navigation fly field 2 cells ahead, as Bird.chase_player
+        rows = np.flatnonzero(chasing)
+        x = self.left[rows] + self.width // 2  # rect centres
+        y = self.bottom[rows] - self.height + self.height // 2
+        (col, row), (step_col, step_row) = self.steps_from(self.game.navigation.fly, x, y, 2)
+        there = (step_col == col) & (step_row == row)  # in the player's cell- head straight for them
+        target_x = np.where(there, player.rect.centerx, step_col * TILESIZE + TILESIZE // 2) - x
+        target_y = np.where(there, player.rect.centery, step_row * TILESIZE + TILESIZE // 2) - y
+        distance = np.sqrt(target_x**2 + target_y**2)
+        moving = distance != 0
+        rows, distance = rows[moving], distance[moving]
+        self.vel[rows, 0] = target_x[moving] / distance * BIRD_SPEED
+        self.vel[rows, 1] = target_y[moving] / distance * BIRD_SPEED
+
+        self.move(swept=False)
+
+
+class SpiderBatch(EnemyBatch):
+
+    def __init__(self, engine, sprites):
+        super().__init__(engine, sprites)
+        self.climbing = np.array([s.newaction == "climb" for s in self.sprites], dtype=bool)
+
+    def step(self):
+        player = self.game.player
+        self.vel[:, 0] = 0
+        self.vel[:, 1] = FALL_VELOCITY
+        grounded = self.land()
+        self.climbing[grounded] = False
+        in_range = grounded & (np.abs(player.pos.y - self.pos[:, 1]) < HEIGHT * 1.5)
+
+        # follow the navigation walk field, as Spider.chase_player
+        rows = np.flatnonzero(in_range)
+        x, y = self.pos[rows, 0], self.pos[rows, 1]
+        (col, row), (step_col, step_row) = self.steps_from(self.game.navigation.walk, x, y)
+        vel_x = self.vel[rows, 0]  # copy, written back below
+
+        # on the player's platform: Spider.walk_to the player, then Spider.climb when directly underneath them
+        there = (step_col == col) & (step_row == row)
+        target_x = player.pos.x - x
+        walk = there & (target_x != 0)
+        vel_x[walk] = SPIDER_SPEED * np.sign(target_x[walk])
+        if player.actionvar == "idle" or player.actionvar == "walk":
+            for i in rows[there & (y - player.pos.y > 0) & (x - player.pos.x == 0)]:
+                self.climb_to(i, player.pos)
+
+        # a platform above on the way: line up with the cell, then climb to it
+        centre_x = col * TILESIZE + TILESIZE // 2
+        up = ~there & (step_row < row)
+        lined_up = up & (x == centre_x)
+        for i, top in zip(rows[lined_up], (step_row[lined_up] + 1) * TILESIZE):
+            self.climb_to(i, (self.pos[i, 0], top))
+        vel_x[up & ~lined_up] = np.clip(centre_x - x, -SPIDER_SPEED, SPIDER_SPEED)[up & ~lined_up]
+
+        # walk along, or off the end of, the platform
+        along = ~there & ~up
+        vel_x[along] = np.where(step_col > col, SPIDER_SPEED, -SPIDER_SPEED)[along]
+        self.vel[rows, 0] = vel_x
+
+        self.vel[self.climbing, 1] = -SPIDER_SPEED
+        self.move()
+
+    def climb_to(self, i, end):
+        self.climbing[i] = True
+        self.game.threads.attach(self.sprites[i], self.pos[i], end)
+
+    def sync_state(self, sprite, i):
+        sprite.newaction = "climb" if self.climbing[i] else "walk"
+
+
+class EnemyEngine:
+    """ Owns one batch per enemy type and updates them all once per tick in place of the sprites' own update()."""
+
+    BATCH_TYPES = ((Caterpillar, CaterpillarBatch), (Bird, BirdBatch), (Spider, SpiderBatch))
+
+    def __init__(self, game):
+        self.game = game
+        self.build_solid()
+
+        self.batches = {}  # sprite type: batch
+        for sprite_type, batch_type in self.BATCH_TYPES:
+            sprites = [s for s in game.enemies if type(s) is sprite_type]
+            self.batches[sprite_type] = batch_type(self, sprites)
+        self.count = len(game.enemies)
+
+    def build_solid(self):
+        grid = self.game.grid
+        rows = [row for col, row in grid.platforms]
+        self.first_row = min(rows, default=0)  # only the rows holding platforms- streamed maps are mostly unloaded
+        self.solid = np.zeros((max(rows, default=0) - self.first_row + 1, grid.cols), dtype=bool)  # platform tiles by [row - first_row, col]
+        for col, row in grid.platforms:
+            self.solid[row - self.first_row, col] = True
+        self.grid_version = grid.version
+
+    def add(self, enemy):
+        """ Take over an enemy spawned after the engine was created."""
+        self.batches[type(enemy)].extend([enemy])
+        self.count += 1
+
+    def sync_all(self):
+        for batch in self.batches.values():
+            batch.sync()
+
+    def update(self):
+        if len(self.game.enemies) != self.count:  # something was killed last tick
+            for batch in self.batches.values():
+                batch.compact()
+            self.count = len(self.game.enemies)
+        if self.grid_version != self.game.grid.version:  # platforms streamed in or out
+            self.build_solid()
+
+        for batch in self.batches.values():
+            if len(batch):
+                batch.step()
+                batch.sync(self.game.camera.view)
@@ -0,0 +1,105 @@
+"""
+This module caches the frames cut from the spritesheets.  Identical frames (same sheet, position, size and flip) are
+shared in memory, and every frame is packed into a single atlas file so later starts load them in one read instead
+of slicing, scaling and flipping the spritesheets again.  The atlas is rebuilt whenever a source PNG, a spritesheet
+dict in settings.py or the display pixel format changes.
+"""
+import hashlib
+import os
+import pickle
+import struct
+import tempfile
+import pygame
+from os import path
+
+CACHE_VERSION = 1  # bump if the atlas layout changes
+HEADER_SIZE = struct.Struct("<I")  # length of the pickled index at the start of the file
+
+
+class FrameCache:
+
+    def __init__(self, filename, spritesheet_dicts):
+        self.filename = filename
+        self.signature = self.make_signature(spritesheet_dicts)
+        self.frames = {}  # (file_name, x, y, width, height, w_new, h_new, flip): surface
+        self.loaded = {}  # same keys: frames read by load(), not yet converted to the display format
+        self.colourkeys = {}  # same keys: colour key to restore on load
+        self.dirty = False  # frames added since the atlas was loaded
+        self.load()
+
+    @staticmethod
+    def make_signature(spritesheet_dicts):
+        """ Hash of everything the cached frames depend on."""
+        display = pygame.display.get_surface()
+        parts = [CACHE_VERSION, display.get_bitsize(), display.get_masks()]
+        for sheet in spritesheet_dicts:
+            image_file = path.join("Images", sheet["file_name"])
+            stat = os.stat(image_file)
+            parts.append((sorted(sheet.items()), stat.st_size, stat.st_mtime_ns))
+        return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+    def get(self, key):
+        return self.frames.get(key)
+
+    def put(self, key, surface, colourkey):
+        self.frames[key] = surface
+        self.colourkeys[key] = colourkey
+        self.dirty = True
+
+    def load(self):
+        """ Read the whole atlas in one go and rebuild the frame surfaces.  Missing or stale files are ignored.  Safe
+            to run on a loader thread- the frames can't be used until convert() has been called on the main one."""
+        try:
+            with open(self.filename, "rb") as f:
+                data = f.read()
+            (index_size,) = HEADER_SIZE.unpack_from(data)
+            index = pickle.loads(data[HEADER_SIZE.size:HEADER_SIZE.size + index_size])
+            if index.get("signature") != self.signature:
+                return
+            pixels = memoryview(data)[HEADER_SIZE.size + index_size:]
+            loaded, colourkeys = {}, {}
+            for key, (offset, width, height, colourkey) in index["frames"].items():
+                loaded[key] = pygame.image.frombytes(bytes(pixels[offset:offset + width * height * 3]), (width, height), "RGB")
+                colourkeys[key] = colourkey
+        except (OSError, struct.error, pickle.UnpicklingError, EOFError, ValueError, AttributeError, KeyError, TypeError):
+            return  # truncated or damaged- the frames are cut from the spritesheets again
+        self.loaded.update(loaded)
+        self.colourkeys.update(colourkeys)
+
+    def convert(self):
+        """ Convert the frames read by load() to the display format, making them available to get()."""
+        for key, image in self.loaded.items():
+            image = image.convert()
+            image.set_colorkey(self.colourkeys[key])
+            self.frames[key] = image
+        self.loaded = {}
+
+    def save(self):
+        """ Write every frame to the atlas file, if any were added since it was loaded."""
+        if not self.dirty:
+            return
+        frames = {}
+        blob = bytearray()
+        for key, image in self.frames.items():
+            frames[key] = (len(blob), image.get_width(), image.get_height(), self.colourkeys[key])
+            blob += pygame.image.tobytes(image, "RGB")
+        index = pickle.dumps({"signature": self.signature, "frames": frames})
+
+        # a temp file of this process's own (batch runs start several games at once), renamed over the atlas so a
+        # half written one is never seen.  Failing is harmless- another process may have written it already
+        folder, name = path.split(path.abspath(self.filename))
+        try:
+            handle, temp_file = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=folder)
+        except OSError:
+            return
+        try:
+            with os.fdopen(handle, "wb") as f:
+                f.write(HEADER_SIZE.pack(len(index)))
+                f.write(index)
+                f.write(blob)
+            os.replace(temp_file, self.filename)
+        except OSError:
+            if path.exists(temp_file):
+                os.remove(temp_file)
+            return
+        self.dirty = False
@@ -0,0 +1,30 @@
+"""
+This module holds the input state read by the sprites each tick, so the game can be driven by the keyboard or by
+injected input (headless runs, scripts, bots).
+"""
+import pygame
+
+
+class InputState:
+    """ Controls held down for a single tick.  shoot is a one tick trigger (key press) rather than a held key."""
+
+    def __init__(self, left=False, right=False, jump=False, shoot=False):
+        self.left = left
+        self.right = right
+        self.jump = jump
+        self.shoot = shoot
+
+    @classmethod
+    def from_keyboard(cls, shoot=False):
+        """ Poll pygame for held keys.  shoot comes from the KEYDOWN event handled in Game.events."""
+        keys = pygame.key.get_pressed()
+        return cls(left=keys[pygame.K_LEFT] or keys[pygame.K_a],
+                   right=keys[pygame.K_RIGHT] or keys[pygame.K_d],
+                   jump=keys[pygame.K_SPACE] or keys[pygame.K_j],
+                   shoot=shoot)
+
+    def __repr__(self):
+        return "InputState(left={}, right={}, jump={}, shoot={})".format(self.left, self.right, self.jump, self.shoot)
+
+
+NO_INPUT = InputState()  # nothing pressed
@@ -0,0 +1,213 @@
+"""
+Navigation for enemy pursuit.  Two breadth first search distance fields over the map cells around the player,
+one for flying enemies (any cell that isn't a platform) and one for walking enemies (cells standing on a platform,
+joined by walking, dropping off ledges and climbing a thread to the platform above).  A field is only searched
+again when the player moves to another cell or platforms are streamed in or out within its reach, and then only
+as far out as the enemies asking for a step, so any number of enemies read their next cell from it for the cost of
+a dict lookup.
+
+The platform layout is read straight from the TileGrid, so streamed maps need no graph rebuilding- a search
+always sees the platforms loaded at the time.  Streaming a chunk in or out only drops the cached edges of the rows
+around it.
+"""
+from collections import deque
+from settings import *
+
+
+def cell_at(x, y):
+    """ Map cell holding the point (x, y).  For a walker's pos (midbottom, on the platform top) that is the cell
+        it stands in, not the platform under it."""
+    return int(x // TILESIZE), int((y - 1) // TILESIZE)
+
+
+def cell_centre(cell):
+    return cell[0] * TILESIZE + TILESIZE // 2, cell[1] * TILESIZE + TILESIZE // 2
+
+
+class DistanceField:
+    """ Steps from every cell within NAV_RADIUS cells of the target to the target, and the neighbouring cell one
+        step closer.  The search is grown only as far as the enemies asking for steps, so a new target costs as
+        much as the furthest enemy in pursuit.  Subclasses define the graph through node(col, row)- True if the cell
+        is in the graph (asking from any other cell can't be answered)- and predecessors(), which is only called
+        once per cell until the platforms change. """
+
+    def __init__(self, grid, radius=NAV_RADIUS):
+        self.grid = grid
+        self.radius = radius
+        self.target = None  # cell the field leads to
+        self.searched = (None, None)  # (target, grid version) of the last search
+        self.distance = {}  # cell: steps to the target
+        self.next = {}  # cell: neighbouring cell one step closer to the target (no entry for the target itself)
+        self.edges = {}  # cell: cells with an edge leading into it, kept until platforms near it change
+        self.edges_version = None
+        self.queue = deque()  # cells found but not yet explored- the search resumes from here
+        self.bounds = None
+        self.searches = 0
+
+    def set_target(self, cell):
+        self.target = cell
+
+    def step_from(self, cell, ahead=1):
+        """ Next cell on the way to the target (the cell ahead steps on, or the target if that is nearer), or None
+            if cell is the target or can't reach it."""
+        if self.searched != (self.target, self.grid.version):
+            self.search()
+        if cell not in self.distance and self.queue and self.in_range(cell) and self.node(*cell):
+            self.grow(cell)
+        step = self.next.get(cell)
+        for _ in range(ahead - 1):  # cells on the way were found before cell, so need no growing
+            step = self.next.get(step, step)
+        return step
+
+    def steps_from(self, cells, ahead=1):
+        """ step_from() for a list of cells, each cell standing in for its own None so the steps pack into an array."""
+        step_from = self.step_from
+        return [step_from(cell, ahead) or cell for cell in cells]
+
+    def search(self):
+        """ Start a new field from the target.  Cells are only explored as far as grow() is asked to go.  If the
+            target hasn't moved and the platforms streamed in or out since are all out of the field's reach, the
+            field is still right and is kept. """
+        last_target = self.searched[0]
+        self.searched = (self.target, self.grid.version)
+        changed = self.forget_edges()
+        if self.target == last_target and self.bounds is not None and not self.overlaps(changed):
+            return
+        self.searches += 1
+        self.distance = {}
+        self.next = {}
+        self.queue = deque()
+        self.bounds = None
+        target = self.start_cell(self.target)
+        if target is None:
+            return
+        col, row = target
+        self.bounds = (col - self.radius, row - self.radius, col + self.radius, row + self.radius)
+        self.distance[target] = 0
+        self.queue.append(target)
+
+    def grow(self, wanted):
+        """ Carry on the breadth first search until wanted has been reached (or every cell in range has)."""
+        first_col, first_row, last_col, last_row = self.bounds
+        edges = self.edges
+        distance = self.distance
+        next_cell = self.next
+        queue = self.queue
+        while queue and wanted not in distance:
+            cell = queue.popleft()
+            steps = distance[cell] + 1
+            before_cells = edges.get(cell)
+            if before_cells is None:
+                before_cells = edges[cell] = list(self.predecessors(cell))
+            for before in before_cells:  # cells with an edge leading into this one
+                if before not in distance and first_col <= before[0] <= last_col and first_row <= before[1] <= last_row:
+                    distance[before] = steps
+                    next_cell[before] = cell
+                    queue.append(before)
+
+    def forget_edges(self):
+        """ Drop the cached edges the platforms changed since the last search could have altered.  Returns the
+            (first, last) rows of the cells dropped, or None if no platform changed. """
+        if self.edges_version == self.grid.version:
+            return None
+        rows = self.grid.rows_changed_since(self.edges_version) if self.edges_version is not None else None
+        self.edges_version = self.grid.version
+        if rows is None:  # too many changes to tell which
+            self.edges = {}
+            return 0, self.grid.rows - 1
+        first, last = self.reach(*rows)
+        self.edges = {cell: before for cell, before in self.edges.items() if not first <= cell[1] <= last}
+        return first, last
+
+    def reach(self, first, last):
+        """ (first, last) rows of the cells whose edges read platforms in rows first to last (a cell's own row
+            and the rows either side, for edges to the 4 neighbouring cells). """
+        return first - 1, last + 1
+
+    def overlaps(self, rows):
+        return rows is not None and rows[0] <= self.bounds[3] and rows[1] >= self.bounds[1]
+
+    def in_range(self, cell):
+        first_col, first_row, last_col, last_row = self.bounds
+        return first_col <= cell[0] <= last_col and first_row <= cell[1] <= last_row
+
+    def start_cell(self, cell):
+        return cell
+
+    def inside(self, col, row):
+        return 0 <= col < self.grid.cols and 0 <= row < self.grid.rows
+
+
+class FlyField(DistanceField):
+    """ Open air: every cell that isn't a platform, joined to its 4 neighbours."""
+
+    def node(self, col, row):
+        return (col, row) not in self.grid.platforms and self.inside(col, row)
+
+    def predecessors(self, cell):
+        col, row = cell
+        for neighbour in ((col - 1, row), (col + 1, row), (col, row - 1), (col, row + 1)):
+            if self.node(*neighbour):
+                yield neighbour
+
+
+class WalkField(DistanceField):
+    """ Cells a walker can stand in (empty, with a platform underneath).  A walker can walk to a standing cell
+        beside it, step off a ledge and fall to the first standing cell below, or climb to the standing cell on
+        the first platform above it (at most NAV_CLIMB_ROWS rows up). """
+
+    def node(self, col, row):
+        platforms = self.grid.platforms
+        return (col, row) not in platforms and (col, row + 1) in platforms and self.inside(col, row)
+
+    def start_cell(self, cell):
+        """ The player may be in the air- lead walkers to the cell they will land in."""
+        col, row = cell
+        platforms = self.grid.platforms
+        for below in range(row, min(self.grid.rows - 1, row + self.radius)):
+            if (col, below) in platforms:
+                return None
+            if (col, below + 1) in platforms:
+                return col, below
+        return None
+
+    def reach(self, first, last):
+        """ A cell's edges read platforms from its radius above (drops) to NAV_CLIMB_ROWS + 1 rows below (climbs)."""
+        return first - NAV_CLIMB_ROWS - 1, last + self.radius
+
+    def predecessors(self, cell):
+        col, row = cell
+        platforms = self.grid.platforms
+        for side in (col - 1, col + 1):
+            if self.node(side, row):  # walk along the platform
+                yield side, row
+
+        # climb: the first standing cell below in this column whose first platform above is the one under cell
+        for below in range(row + 2, min(self.grid.rows - 1, row + 1 + NAV_CLIMB_ROWS)):
+            if (col, below) in platforms:
+                break
+            if (col, below + 1) in platforms:
+                if self.inside(col, below):
+                    yield col, below
+                break
+
+        # drop: walking off the end of a platform beside any open cell above cell lands here
+        for above in range(row - 1, max(-1, row - self.radius), -1):
+            if (col, above) in platforms:
+                break
+            for side in (col - 1, col + 1):
+                if self.node(side, above):
+                    yield side, above
+
+
+class Navigation:
+    """ The fly and walk fields, both leading to the player's current cell."""
+
+    def __init__(self, grid):
+        self.fly = FlyField(grid, NAV_FLY_RADIUS)
+        self.walk = WalkField(grid)
+
+    def update(self, player):
+        """ Point both fields at the player's cell.  Searching is left until an enemy asks for a step."""
+        self.fly.set_target(cell_at(*player.rect.center))  # fly at the player's body, not their feet
+        self.walk.set_target(cell_at(player.pos.x, player.pos.y))
@@ -0,0 +1,177 @@
+"""
+Built in frame profiler.  Times each phase of a frame (events, update split by sprite class, animation and every
+draw pass), keeps a rolling window of timings for percentiles, counts sprites and blits, draws an overlay (toggle
+with F3) and can write a per-frame trace for finding spikes after a run:
+
+    .csv    one row per frame, phase and value:  frame_no,name,value  (ms for timings)
+    .json   one JSON object per frame per line:  {"frame_no": 1, "frame": 16.6, "update Player": 0.02, ...}
+"""
+import csv
+import json
+import time
+import pygame
+from collections import deque
+from contextlib import nullcontext
+from settings import *
+
+NO_TIMING = nullcontext()  # returned by phase() while the profiler is off, so timing costs next to nothing
+OVERLAY_REFRESH = 0.5  # seconds between overlay redraws (percentiles are sorted, so not every frame)
+
+
+class Phase:
+    """ Context manager adding the time spent inside it to one named phase of the current frame."""
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+
+
+class Profiler:
+
+    def __init__(self, enabled=PROFILE, trace_file=PROFILE_TRACE, window=PROFILE_WINDOW):
+        self.enabled = enabled or bool(trace_file)  # a trace is written whether or not the overlay is shown
+        self.overlay = enabled  # draw the overlay (F3)
+        self.window = window  # frames kept for percentiles
+        self.history = {}  # phase name: timings in seconds of the last window frames
+        self.phases = {}  # phase name: reusable Phase context manager
+        self.frame = {}  # phase name: seconds spent this frame
+        self.frame_count = 0
+        self.frame_start = None
+        self.counts = {}  # "sprites", "blits" etc for this frame
+        self.overlay_image = None
+        self.overlay_time = 0
+        self.overlay_font = None  # monospaced so the columns line up, loaded on first use
+
+        self.trace_file = trace_file
+        self.trace = None  # open trace file
+        self.trace_writer = None  # csv writer (None for json)
+
+    def phase(self, name):
+        """ with profiler.phase("update"): ...  times the block as part of the current frame."""
+        if not self.enabled:
+            return NO_TIMING
+        timer = self.phases.get(name)
+        if timer is None:
+            timer = self.phases[name] = Phase(self, name)
+        return timer
+
+    def add(self, name, seconds):
+        self.frame[name] = self.frame.get(name, 0) + seconds
+
+    def count(self, name, value):
+        if self.enabled:
+            self.counts[name] = value
+
+    def update_sprites(self, group):
+        """ Same as group.update(), with the time taken recorded per sprite class."""
+        if not self.enabled:
+            group.update()
+            return
+        for sprite in group.sprites():
+            self.update_sprite(sprite)
+
+    def update_sprite(self, sprite, *args):
+        """ sprite.update(*args), timed under "update <class name>"."""
+        start = time.perf_counter()
+        sprite.update(*args)
+        name = "update " + type(sprite).__name__
+        self.frame[name] = self.frame.get(name, 0) + time.perf_counter() - start
+
+    def start_frame(self):
+        if self.enabled:
+            self.frame_start = time.perf_counter()
+
+    def end_frame(self):
+        if not self.enabled or self.frame_start is None:
+            return
+        self.frame["frame"] = time.perf_counter() - self.frame_start
+        self.frame_count += 1
+        for name, seconds in self.frame.items():
+            timings = self.history.get(name)
+            if timings is None:
+                timings = self.history[name] = deque(maxlen=self.window)
+            timings.append(seconds)
+        if self.trace_file:
+            self.write_trace()
+        self.frame = {}
+        self.frame_start = None
+
+    def toggle_overlay(self):
+        """ Show or hide the overlay.  Timings are only collected while it is shown, or while a trace is being
+            written (hiding the overlay doesn't cut a trace short)."""
+        self.overlay = not self.overlay
+        self.enabled = self.overlay or self.trace is not None
+        if not self.enabled:  # drop the part collected frame, so it isn't added to the next one when shown again
+            self.frame = {}
+            self.counts = {}
+            self.frame_start = None
+
+    def percentiles(self, name, points=(50, 95, 99)):
+        """ Timings in ms of phase name at each percentile over the rolling window."""
+        timings = sorted(self.history.get(name, ()))
+        if not timings:
+            return [0] * len(points)
+        return [timings[min(len(timings) - 1, int(len(timings) * p / 100))] * 1000 for p in points]
+
+    def report(self):
+        """ Lines of "phase  mean p50 p95 p99" in ms, slowest mean first."""
+        lines = []
+        means = {name: sum(timings) / len(timings) * 1000 for name, timings in self.history.items() if timings}
+        for name in sorted(means, key=means.get, reverse=True):
+            p50, p95, p99 = self.percentiles(name)
+            lines.append("{:<22}{:7.2f}{:7.2f}{:7.2f}{:7.2f}".format(name, means[name], p50, p95, p99))
+        return lines
+
+    def draw(self, game):
+        """ Blit the overlay in the top left corner, redrawing it every OVERLAY_REFRESH seconds."""
+        if not self.overlay:
+            return
+        now = time.perf_counter()
+        if self.overlay_image is None or now - self.overlay_time > OVERLAY_REFRESH:
+            self.overlay_image = self.make_overlay()
+            self.overlay_time = now
+        if game.renderer and game.renderer.recording:
+            game.renderer.blit("profiler", self.overlay_image, (0, 0))
+        else:
+            game.screen.blit(self.overlay_image, (0, 0))
+
+    def make_overlay(self):
+        if self.overlay_font is None:
+            self.overlay_font = pygame.font.SysFont("monospace", 14)
+        counts = "  ".join("{} {}".format(name, value) for name, value in sorted(self.counts.items()))
+        lines = ["{:<22}{:>7}{:>7}{:>7}{:>7}".format("ms", "mean", "p50", "p95", "p99")] + self.report() + [counts]
+        rendered = [self.overlay_font.render(line, True, WHITE) for line in lines]
+        image = pygame.Surface((max(line.get_width() for line in rendered) + 8, sum(line.get_height() for line in rendered) + 8))
+        image.set_alpha(180)  # see the game through it
+        y = 4
+        for line in rendered:
+            image.blit(line, (4, y))
+            y += line.get_height()
+        return image
+
+    def write_trace(self):
+        """ Append this frame to the trace file.  Rows are written as they happen so a crash keeps the trace."""
+        values = [(name, round(seconds * 1000, 4)) for name, seconds in self.frame.items()] + list(self.counts.items())
+        if self.trace is None:
+            self.trace = open(self.trace_file, "w", newline="")
+            self.trace_writer = None if self.trace_file.endswith(".json") else csv.writer(self.trace)
+            if self.trace_writer:
+                self.trace_writer.writerow(("frame_no", "name", "value"))
+        if self.trace_writer:
+            self.trace_writer.writerows((self.frame_count, name, value) for name, value in values)
+        else:
+            row = {"frame_no": self.frame_count}
+            row.update(values)
+            self.trace.write(json.dumps(row) + "\n")
+
+    def close(self):
+        """ Finish the trace file."""
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
@@ -0,0 +1,199 @@
+"""
+This module holds the pre-baked layers drawn underneath the moving sprites.
+"""
+import pygame
+from settings import *
+
+COLOURKEY = (255, 0, 255)  # transparent fill for baked surfaces (not used by the tile art)
+
+
+class Background:
+    """ Parallax background layers, furthest first.  Each image is converted to the display format once and tiled
+        onto a surface one image larger than the screen each way, so it repeats over the whole map and the part on
+        screen at any scroll position is a single blit.  A layer scrolls at its own fraction of the camera
+        movement (0 stays put, 1 moves with the platforms).  The furthest layer is opaque, so with one layer a
+        frame costs the same single screen sized blit as an unscrolled image would (an axis a layer doesn't
+        scroll along gets no extra image, keeping its rows as short as the image's). """
+
+    def __init__(self, layers):
+        self.layers = []  # (tiled surface, image width, image height, x factor, y factor)
+        for n, (image, factor_x, factor_y, colourkey) in enumerate(layers):
+            if n == 0 or colourkey is not None:  # nothing to see through the furthest layer
+                image = image.convert()
+            else:
+                image = image.convert_alpha()
+            width, height = image.get_size()
+            size = (width * (-(-WIDTH // width) + bool(factor_x)), height * (-(-HEIGHT // height) + bool(factor_y)))
+            tiled = pygame.Surface(size, image.get_flags(), image)
+            for y in range(0, tiled.get_height(), height):
+                for x in range(0, tiled.get_width(), width):
+                    tiled.blit(image, (x, y))
+            if n and colourkey is not None:
+                tiled.set_colorkey(colourkey, pygame.RLEACCEL)
+            self.layers.append((tiled, width, height, factor_x, factor_y))
+        self.area = pygame.Rect(0, 0, WIDTH, HEIGHT)  # reused for the visible slice of each layer
+
+    def draw(self, screen, camera):
+        area = self.area
+        scroll_x, scroll_y = -camera.rect.x, -camera.rect.y
+        for tiled, width, height, factor_x, factor_y in self.layers:
+            area.topleft = (int(scroll_x * factor_x) % width, int(scroll_y * factor_y) % height)
+            screen.blit(tiled, (0, 0), area)
+
+
+class StaticLayer:
+    """ Platform tiles never move, so they are drawn once onto chunk surfaces when the level loads.  Each frame
+        only the part of each chunk inside the camera viewport is blitted, so draw cost depends on screen size
+        rather than on how many tiles the map holds. """
+
+    def __init__(self, image, map=None, tile="1"):
+        self.image = image
+        self.chunk_size = STATIC_CHUNK_TILES * TILESIZE  # chunk side length in pixels
+        self.chunks = {}  # (chunk_x, chunk_y): baked surface, only for chunks containing at least one tile
+        self.spare = []  # surfaces of removed chunks, cleared and reused for new ones
+        self.version = 0  # bumped whenever tiles are added or removed
+
+        if map is not None:  # streamed maps add their tiles chunk by chunk instead
+            for row, tiles in enumerate(map.data):
+                for col, char in enumerate(tiles):
+                    if char == tile:
+                        self.add_tile(col, row)
+
+    def add_tile(self, col, row):
+        key = (col // STATIC_CHUNK_TILES, row // STATIC_CHUNK_TILES)
+        surface = self.chunks.get(key)
+        if surface is None:
+            if self.spare:
+                surface = self.spare.pop()
+            else:
+                surface = pygame.Surface((self.chunk_size, self.chunk_size)).convert()
+                surface.set_colorkey(COLOURKEY, pygame.RLEACCEL)
+            surface.fill(COLOURKEY)
+            self.chunks[key] = surface
+        surface.blit(self.image, ((col % STATIC_CHUNK_TILES) * TILESIZE, (row % STATIC_CHUNK_TILES) * TILESIZE))
+        self.version += 1
+
+    def remove_rows(self, first_row, last_row):
+        """ Drop the baked surfaces lying entirely within map rows first_row to last_row (inclusive)."""
+        first_chunk = -(-first_row // STATIC_CHUNK_TILES)  # first chunk starting at or below first_row
+        last_chunk = (last_row + 1) // STATIC_CHUNK_TILES - 1  # last chunk ending at or above last_row
+        for key in [key for key in self.chunks if first_chunk <= key[1] <= last_chunk]:
+            self.spare.append(self.chunks.pop(key))
+        self.version += 1
+
+    def draw(self, screen, camera):
+        viewport = pygame.Rect(-camera.rect.x, -camera.rect.y, WIDTH, HEIGHT)  # visible area in map pixels
+        first_x, first_y = viewport.left // self.chunk_size, viewport.top // self.chunk_size
+        last_x, last_y = (viewport.right - 1) // self.chunk_size, (viewport.bottom - 1) // self.chunk_size
+
+        for chunk_y in range(first_y, last_y + 1):
+            for chunk_x in range(first_x, last_x + 1):
+                surface = self.chunks.get((chunk_x, chunk_y))
+                if surface is None:
+                    continue
+                chunk_rect = pygame.Rect(chunk_x * self.chunk_size, chunk_y * self.chunk_size, self.chunk_size, self.chunk_size)
+                area = chunk_rect.clip(viewport)  # visible part of this chunk in map pixels
+                screen.blit(surface, (area.x + camera.rect.x, area.y + camera.rect.y), area.move(-chunk_rect.x, -chunk_rect.y))
+
+
+class ThreadStore:
+    """ The silk threads of climbing spiders.  Each spider has at most one live thread (from where it started
+        climbing to where the player stood), kept only while it climbs, and the store never holds more than
+        THREAD_LIMIT threads- the oldest is dropped first. """
+
+    def __init__(self, limit=THREAD_LIMIT):
+        self.limit = limit
+        self.threads = {}  # spider: (start x, start y, end x, end y) in map pixels, oldest first
+
+    def __len__(self):
+        return len(self.threads)
+
+    def attach(self, spider, start, end):
+        self.threads.pop(spider, None)  # a new climb replaces the spider's old thread
+        self.threads[spider] = (start[0], start[1], end[0], end[1])
+        if len(self.threads) > self.limit:
+            del self.threads[next(iter(self.threads))]
+
+    def visible(self, camera):
+        """ Screen space (start, end) of every thread crossing the camera view.  Threads of spiders that have
+            died or stopped climbing are dropped here. """
+        lines = []
+        view = camera.view
+        offset_x, offset_y = camera.rect.topleft
+        for spider, (x1, y1, x2, y2) in list(self.threads.items()):
+            if spider.newaction != "climb" or not spider.alive():
+                del self.threads[spider]
+            elif min(x1, x2) <= view.right and max(x1, x2) >= view.left and min(y1, y2) <= view.bottom and max(y1, y2) >= view.top:
+                lines.append((spider, (x1 + offset_x, y1 + offset_y), (x2 + offset_x, y2 + offset_y)))
+        return lines
+
+
+class DirtyRenderer:
+    """ Optional renderer that only pushes the parts of the screen that changed.  Draw calls made between begin()
+        and end() are recorded with a key (the sprite, or a HUD/thread slot).  While the camera is still, anything
+        whose image or position differs from last frame has its old and new rect restored from a cached backdrop
+        (background + static layer), only the draw calls touching those rects are replayed, and just those rects
+        are sent to the display.  When the camera moves the whole frame is redrawn and flipped as usual. """
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.screen_rect = screen.get_rect()
+        self.backdrop = pygame.Surface(self.screen_rect.size).convert()
+        self.backdrop_key = None  # (camera position, static layer version) the backdrop was drawn for
+        self.last = {}  # key: (look, rect) drawn last frame
+        self.current = {}
+        self.commands = []  # (rect, draw function, args) in draw order
+        self.recording = False
+        self.full_redraws = 0  # frames since start drawn in full / as dirty rects
+        self.partial_redraws = 0
+
+    def begin(self, background, static_layer, camera):
+        self.recording = True
+        self.current = {}
+        self.commands = []
+        backdrop_key = (camera.rect.topleft, static_layer.version)
+        self.full = backdrop_key != self.backdrop_key
+        if self.full:  # camera scrolled (or tiles changed)- rebuild the backdrop
+            background.draw(self.backdrop, camera)
+            static_layer.draw(self.backdrop, camera)
+            self.backdrop_key = backdrop_key
+
+    def blit(self, key, surface, dest):
+        rect = pygame.Rect(dest[0], dest[1], surface.get_width(), surface.get_height())
+        self.current[key] = (surface, rect)
+        self.commands.append((rect, self.screen.blit, (surface, rect)))
+
+    def line(self, key, colour, start, end):
+        rect = pygame.Rect(min(start[0], end[0]), min(start[1], end[1]), abs(end[0] - start[0]) + 1, abs(end[1] - start[1]) + 1).inflate(2, 2)
+        self.current[key] = ((colour, start, end), rect)
+        self.commands.append((rect, pygame.draw.line, (self.screen, colour, start, end)))
+
+    def end(self):
+        self.recording = False
+        if self.full:
+            self.screen.blit(self.backdrop, (0, 0))
+            for rect, draw, args in self.commands:
+                draw(*args)
+            pygame.display.flip()
+            self.full_redraws += 1
+        else:
+            dirty = []
+            for key, (look, rect) in self.last.items():
+                if self.current.get(key, (None, None)) != (look, rect):  # moved, changed or gone
+                    dirty.append(rect.clip(self.screen_rect))
+            for key, (look, rect) in self.current.items():
+                if self.last.get(key, (None, None)) != (look, rect):
+                    dirty.append(rect.clip(self.screen_rect))
+            dirty = [rect for rect in dirty if rect.width and rect.height]
+
+            for area in dirty:
+                self.screen.set_clip(area)  # so redrawn sprites can't cover anything drawn after them outside the area
+                self.screen.blit(self.backdrop, area, area)  # restore background and platforms
+                for rect, draw, args in self.commands:
+                    if rect.colliderect(area):  # redraw anything overlapping the restored area, in the original order
+                        draw(*args)
+            self.screen.set_clip(None)
+            pygame.display.update(dirty)
+            self.partial_redraws += 1
+
+        self.last = self.current
@@ -0,0 +1,241 @@
+"""
+Replay recording and playback.  A replay holds the seed of the level's random layout and the controls held and
+frame time of every tick- all Game.step() needs to play a game out again exactly as it went.  Games are only
+recorded with RECORD_REPLAYS set in settings.py, and then only the last REPLAY_KEEP recordings are kept:
+
+    python replay.py replays/20260101-120000.replay              watch it in real time
+    python replay.py replays/20260101-120000.replay --fast       as fast as it will go (drawn at most FPS times a second)
+    python replay.py replays/20260101-120000.replay --headless   no window, print the result and ticks per second
+    python replay.py --check                                      record games back to back and check each replays exactly
+
+File format (little endian):
+    header      b"PLRP", version (B), level seed (I), pick ups (H), options (B: 1 enemy engine, 2 scheduler),
+                map file name length (H), map file name (utf-8)
+    tick        flags (B: 1 left, 2 right, 4 jump, 8 shoot, 128 frame time follows), then only when it isn't the
+                default 1/FPS the frame time in ms (B, or 255 and then H for frames of 255 ms or more)- 2 bytes per
+                tick played in a window, 1 byte per tick headless
+    end         flags END (64), final score (i), ticks played (I).  Missing if the game crashed.
+"""
+import argparse
+import os
+import sys
+import shutil
+import struct
+import tempfile
+import time
+from inputs import InputState
+from settings import *
+
+MAGIC = b"PLRP"
+VERSION = 1
+HEADER = struct.Struct("<4sBIHBH")
+LONG_FRAME = 255  # frame time byte value meaning the frame time follows as H
+LONG_FRAME_TIME = struct.Struct("<H")
+END_RECORD = struct.Struct("<iI")
+LEFT, RIGHT, JUMP, SHOOT, END, HAS_FRAME_TIME = 1, 2, 4, 8, 64, 128
+ENGINE_OPTION, SCHEDULER_OPTION = 1, 2
+DEFAULT_DT = 1 / FPS
+CHECK_SCRIPT = "RJ30 R20 LS1 LJ30 L20 J60 RS1 .40"  # batch_runner input script the --check games are played with
+INPUTS = [InputState(bool(f & LEFT), bool(f & RIGHT), bool(f & JUMP), bool(f & SHOOT)) for f in range(16)]  # by flags
+
+
+class ReplayRecorder:
+    """ Appends each tick's controls to a replay file.  Ticks are collected in a bytearray and written
+        REPLAY_BUFFER bytes at a time, so recording costs a few byte appends per frame. """
+
+    def __init__(self, filename, map_file, seed, pick_ups, enemy_engine=False, scheduler=False):
+        self.filename = filename
+        self.file = open(filename, "wb")
+        self.ticks = 0
+        options = (ENGINE_OPTION if enemy_engine else 0) | (SCHEDULER_OPTION if scheduler else 0)
+        name = map_file.encode("utf-8")
+        self.buffer = bytearray(HEADER.pack(MAGIC, VERSION, seed, pick_ups, options, len(name)) + name)
+
+    @classmethod
+    def for_game(cls, game, folder=REPLAY_DIR):
+        """ Start recording game to a new time stamped file in folder (relative to the game folder)."""
+        folder = os.path.join(game.dir, folder)
+        os.makedirs(folder, exist_ok=True)
+        prune(folder, REPLAY_KEEP - 1)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        filename = os.path.join(folder, stamp + ".replay")
+        n = 1
+        while os.path.exists(filename):  # more than one game in a second
+            filename = os.path.join(folder, "{}-{}.replay".format(stamp, n))
+            n += 1
+        return cls(filename, game.map_file, game.level_seed, game.pick_up_count, game.use_enemy_engine, game.use_scheduler)
+
+    def record(self, inputs, dt):
+        flags = (LEFT if inputs.left else 0) | (RIGHT if inputs.right else 0) | \
+                (JUMP if inputs.jump else 0) | (SHOOT if inputs.shoot else 0)
+        if dt == DEFAULT_DT:
+            self.buffer.append(flags)
+        else:  # frame time from clock.tick() is whole ms, so this is exact for real play
+            ms = min(0xFFFF, round(dt * 1000))
+            self.buffer.append(flags | HAS_FRAME_TIME)
+            if ms < LONG_FRAME:
+                self.buffer.append(ms)
+            else:
+                self.buffer.append(LONG_FRAME)
+                self.buffer += LONG_FRAME_TIME.pack(ms)
+        self.ticks += 1
+        if len(self.buffer) >= REPLAY_BUFFER:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.buffer.clear()
+
+    def close(self, score=None):
+        """ Finish the file.  Leave score as None if the game didn't end normally (no end record is written)."""
+        if self.file is None:
+            return
+        if score is not None:
+            self.buffer.append(END)
+            self.buffer += END_RECORD.pack(score, self.ticks)
+        self.flush()
+        self.file.close()
+        self.file = None
+
+
+class Replay:
+    """ A replay file read back: header fields, the (InputState, dt) of every tick and the recorded result."""
+
+    def __init__(self, filename):
+        with open(filename, "rb") as f:
+            data = f.read()
+        magic, version, self.seed, self.pick_ups, options, name_length = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a version {} replay file".format(filename, VERSION))
+        self.enemy_engine = bool(options & ENGINE_OPTION)
+        self.scheduler = bool(options & SCHEDULER_OPTION)
+        i = HEADER.size
+        self.map_file = data[i:i + name_length].decode("utf-8")
+        i += name_length
+
+        self.ticks = []
+        self.score = self.tick_count = None  # recorded result (None if the recording was cut short)
+        while i < len(data):
+            flags = data[i]
+            i += 1
+            if flags & END:
+                self.score, self.tick_count = END_RECORD.unpack_from(data, i)
+                break
+            if flags & HAS_FRAME_TIME:
+                ms = data[i]
+                i += 1
+                if ms == LONG_FRAME:
+                    ms = LONG_FRAME_TIME.unpack_from(data, i)[0]
+                    i += LONG_FRAME_TIME.size
+                dt = ms / 1000
+            else:
+                dt = DEFAULT_DT
+            self.ticks.append((INPUTS[flags & 15], dt))
+
+
+def prune(folder, keep):
+    """ Delete the oldest replays in folder until at most keep are left (keep < 0 deletes none)."""
+    if keep < 0:
+        return
+    replays = sorted(name for name in os.listdir(folder) if name.endswith(".replay"))
+    for name in replays[:max(0, len(replays) - keep)]:
+        os.remove(os.path.join(folder, name))
+
+
+def play(replay, realtime=True, headless=False):
+    """ Play a Replay through a fresh game.  In real time each tick takes its recorded frame time, otherwise ticks
+        run uncapped and (with a window) the screen is redrawn at most FPS times a second.  Returns the result,
+        including whether it matched the recording. """
+    import pygame
+    from Platformer import Game
+
+    game = Game(headless=headless, map_file=replay.map_file, seed=replay.seed, enemy_engine=replay.enemy_engine,
+                pick_ups=replay.pick_ups, scheduler=replay.scheduler)
+    game.load_level()
+
+    start = last_draw = time.perf_counter()
+    tick = 0
+    for inputs, dt in replay.ticks:
+        if not headless:
+            if realtime and dt > 0:
+                game.clock.tick(1 / dt)
+            if any(event.type == pygame.QUIT for event in pygame.event.get()):
+                break
+        tick += 1
+        alive = game.step(inputs, dt)
+        if not headless:
+            now = time.perf_counter()
+            if realtime or now - last_draw >= DEFAULT_DT:
+                game.draw()
+                last_draw = now
+        if not alive:
+            break
+    run_time = time.perf_counter() - start
+    pygame.quit()
+
+    return {"ticks": tick,
+            "score": game.score,
+            "recorded_ticks": replay.tick_count,
+            "recorded_score": replay.score,
+            "matches": replay.score is None or (tick, game.score) == (replay.tick_count, replay.score),
+            "ticks_per_sec": round(tick / run_time, 1) if run_time else None}
+
+
+def check(games=2, ticks=3000, script=CHECK_SCRIPT):
+    """ Record games played one after another by the same Game, as in a session, then replay each of them.
+        Game state carried from one game to the next shows up as a later game that doesn't replay.  Returns
+        True if every game matched its recording. """
+    import pygame
+    from Platformer import Game
+    from batch_runner import script_inputs
+
+    folder = tempfile.mkdtemp(prefix="platformer_replays_")
+    try:
+        game = Game(headless=True)
+        inputs = script_inputs(script)
+        filenames = []
+        for n in range(games):
+            game.start_game(record=True, replay_folder=folder)
+            filenames.append(game.recorder.filename)
+            for tick in range(ticks):
+                if not game.step(next(inputs)):
+                    break
+            game.playing = False  # ended either way, so the result is recorded
+            game.end_game()
+        pygame.quit()
+
+        matched = True
+        for n, filename in enumerate(filenames):
+            result = play(Replay(filename), realtime=False, headless=True)
+            print("game {}: ticks {ticks}  score {score}  recorded ticks {recorded_ticks}  recorded score "
+                  "{recorded_score}  {}".format(n + 1, "matches" if result["matches"] else "DIVERGED", **result))
+            matched = matched and result["matches"]
+        return matched
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play back a recorded game.")
+    parser.add_argument("replay", nargs="?")
+    parser.add_argument("--fast", action="store_true", help="run uncapped instead of in real time")
+    parser.add_argument("--headless", action="store_true", help="no window (implies --fast)")
+    parser.add_argument("--check", action="store_true", help="record two games back to back and check both replay exactly")
+    args = parser.parse_args()
+
+    if args.check:
+        if not check():
+            sys.exit(1)
+        return
+    if args.replay is None:
+        parser.error("a replay file is needed (or --check)")
+
+    result = play(Replay(args.replay), realtime=not (args.fast or args.headless), headless=args.headless)
+    print("ticks {ticks}  score {score}  recorded ticks {recorded_ticks}  recorded score {recorded_score}  "
+          "{ticks_per_sec} ticks/s".format(**result))
+    if not result["matches"]:
+        print("replay diverged from the recording")
+
+
+if __name__ == "__main__":
+    main()
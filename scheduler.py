@@ -0,0 +1,181 @@
+"""
+Activity-region update scheduler.  Replaces all_sprites.update() so the cost of a tick depends on what is near the
+player rather than on the size of the level:
+
+    static sprites      platforms and pick ups never move, so they are never in the update list
+    active              within ACTIVE_MARGIN of the camera view- updated every tick
+    band                within SLEEP_MARGIN- updated every REDUCED_RATE ticks (staggered), each update covering the
+                        ticks since the last one.  Caterpillars move in one go up to the next cell column, where
+                        the platform edge check could change, so they keep exactly to their full rate path; birds
+                        and spiders steer once per update and drift from it (accepted- see REDUCED_RATE in settings)
+    asleep              further away- not updated at all, kept in buckets by map region until the camera comes near
+
+SLEEP_MARGIN is far enough from the player that no enemy reacts to the player there, so when an enemy wakes up
+the ticks it slept through are replayed one at a time (spread over a few ticks, CATCH_UP_BUDGET updates per tick)
+and it ends up exactly where it would have been had it never slept.  Replaying stops early once the enemy's state
+repeats (a caterpillar pacing a platform, an idle bird or spider), skipping whole cycles.
+
+With the enemy engine on, enemies are updated by the engine and only the player and missiles go through here.
+"""
+from settings import *
+
+
+class UpdateScheduler:
+
+    def __init__(self, game):
+        self.game = game
+        self.tick = 0
+        self.awake = {}  # sprite: tick it has been updated up to, in update order
+        self.asleep = {}  # (region col, region row): {sprite: tick it has been updated up to}
+        self.catching_up = {}  # sprite: {state: tick} seen while replaying missed ticks (None once a cycle was skipped)
+        self.order = {}  # sprite: number of sprites added before it (update order, and the stagger slot for band updates)
+        self.woken_at = None  # camera position asleep buckets were last checked at
+
+    def add(self, sprite):
+        """ Schedule a mobile sprite (player or enemy) from the current tick."""
+        self.awake[sprite] = self.tick
+        self.order[sprite] = len(self.order)
+
+    def region_of(self, rect):
+        return rect.centerx // SCHEDULER_REGION, rect.centery // SCHEDULER_REGION
+
+    def update(self):
+        self.tick += 1
+        tick = self.tick
+        view = self.game.camera.view
+        active = view.inflate(2 * ACTIVE_MARGIN, 2 * ACTIVE_MARGIN)
+        band = view.inflate(2 * SLEEP_MARGIN, 2 * SLEEP_MARGIN)
+        if self.woken_at != view.topleft:  # sleeping sprites don't move, so only a camera move can wake them
+            self.wake(band)
+            self.woken_at = view.topleft
+
+        update = self.game.profiler.update_sprite if self.game.profiler.enabled else None
+        budget = CATCH_UP_BUDGET
+        for sprite, last in list(self.awake.items()):
+            if not sprite.alive():  # killed since the last tick
+                self.remove(sprite)
+                continue
+            rect = sprite.rect
+
+            if sprite is self.game.player or active.colliderect(rect):
+                if sprite in self.catching_up or last < tick - 1:
+                    self.catch_up(sprite, None)  # about to be seen, finish replaying now
+                self.step(sprite, 1, update)
+
+            elif band.colliderect(rect):
+                if sprite in self.catching_up or tick - last > REDUCED_RATE:
+                    budget -= self.catch_up(sprite, max(budget, 0))
+                elif (tick + self.order[sprite]) % REDUCED_RATE == 0:
+                    self.step(sprite, tick - last, update)
+
+            else:
+                del self.awake[sprite]
+                self.catching_up.pop(sprite, None)
+                self.asleep.setdefault(self.region_of(rect), {})[sprite] = last
+
+        for missile in self.game.missiles.sprites():  # always on screen, always full rate
+            if update:
+                update(missile)
+            else:
+                missile.update()
+
+    def step(self, sprite, ticks, update):
+        args = (ticks,) if ticks != 1 else ()  # the player's update() takes no tick count- it is never in the band
+        if update:
+            update(sprite, *args)
+        else:
+            sprite.update(*args)
+        self.awake[sprite] = self.tick
+
+    def wake(self, band):
+        """ Move sleeping sprites in regions overlapping band back to the update list."""
+        first_col, first_row = band.left // SCHEDULER_REGION, band.top // SCHEDULER_REGION
+        last_col, last_row = band.right // SCHEDULER_REGION, band.bottom // SCHEDULER_REGION
+        woken = False
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                sleepers = self.asleep.pop((col, row), None)
+                if sleepers:
+                    woken = self.wake_sleepers(sleepers) or woken
+        if woken:
+            self.sort_awake()
+
+    def wake_sleepers(self, sleepers):
+        woken = False
+        for sprite, last in sleepers.items():
+            if sprite.alive():
+                self.awake[sprite] = last
+                self.catching_up[sprite] = {}
+                woken = True
+            else:  # killed while asleep (streamed out)
+                del self.order[sprite]
+        return woken
+
+    def sort_awake(self):
+        """ Put the update list back in the order sprites were added, as all_sprites.update() would run them
+            (enemies read the player's position, so who goes first matters). """
+        order = self.order
+        self.awake = dict(sorted(self.awake.items(), key=lambda item: order[item[0]]))
+
+    def catch_up(self, sprite, budget):
+        """ Replay the ticks sprite missed one at a time, at most budget of them (all if None).  Returns the
+            number of updates run."""
+        tick = self.tick - 1  # the current tick is run by the caller
+        last = self.awake[sprite]
+        seen = self.catching_up.get(sprite)
+        runs = 0
+        while last < tick and (budget is None or runs < budget):
+            if seen is not None:
+                state = (sprite.pos.x, sprite.pos.y, sprite.vel.x, sprite.vel.y, sprite.direction, sprite.newaction)
+                if state in seen:  # back in a state seen before- skip every whole cycle still to come
+                    period = last - seen[state]
+                    last += (tick - last) // period * period
+                    seen = None
+                    continue
+                seen[state] = last
+            sprite.update()
+            last += 1
+            runs += 1
+
+        self.awake[sprite] = last
+        if last < tick:
+            self.catching_up[sprite] = seen
+        else:
+            self.catching_up.pop(sprite, None)
+            if budget is not None:
+                self.awake[sprite] = self.tick  # band sprite now up to date including this tick's (skipped) update
+                if last < self.tick:
+                    sprite.update()
+                    runs += 1
+        return runs
+
+    def catch_up_all(self):
+        """ Bring every sprite, asleep or not, up to the current tick (e.g. before inspecting or saving them all)."""
+        for sleepers in self.asleep.values():
+            self.wake_sleepers(sleepers)
+        self.asleep = {}
+        self.sort_awake()
+        self.woken_at = None
+        self.tick += 1  # catch_up() replays up to the tick before the current one
+        for sprite in list(self.awake):
+            if sprite.alive() and (sprite in self.catching_up or self.awake[sprite] < self.tick - 1):
+                self.catch_up(sprite, None)
+        self.tick -= 1
+
+    def discard(self, sprite):
+        """ Forget a sprite taken out of the game, asleep or not (asleep it would sit in its bucket until woken)."""
+        if sprite in self.awake:
+            self.remove(sprite)
+            return
+        bucket = self.region_of(sprite.rect)
+        sleepers = self.asleep.get(bucket)
+        if sleepers and sprite in sleepers:
+            del sleepers[sprite]
+            if not sleepers:
+                del self.asleep[bucket]
+        self.order.pop(sprite, None)
+
+    def remove(self, sprite):
+        del self.awake[sprite]
+        self.catching_up.pop(sprite, None)
+        del self.order[sprite]
@@ -3,8 +3,12 @@ TITLE = "Rainbow Ripoff!"
 TILESIZE = 36  # length in pixels
 WIDTH = TILESIZE * 32  # screen width
 HEIGHT = TILESIZE * 18  # screen height
-FPS = 60  # frames per second
+FPS = 60  # game ticks per second (sprite speeds are in pixels per tick)
+RENDER_FPS = 60  # frame rate cap, independent of the tick rate- raise it on fast machines
+MAX_FRAME_SKIP = 5  # most ticks run between two frames before the game slows down instead
+INTERPOLATE = True  # draw moving sprites part way between the last two ticks
 HIGHSCORE_FILE = "highscore.txt"
+FRAME_CACHE_FILE = "frame_cache.bin"  # packed spritesheet frames, rebuilt automatically when stale
 
 # mapwidth = 1152
 # mapheight = 1296
@@ -30,9 +34,35 @@ ENEMY_HEIGHT = TILESIZE
 BIRD_SPEED = 2
 CTPLL_SPEED = 1
 SPIDER_SPEED = 2
+ENEMY_ENGINE = False  # update enemies in NumPy batches (enemy_engine.py) rather than one sprite at a time- needs numpy
+
+# Enemy collisions (collision.SpatialHash)
+BROADPHASE_CELL = TILESIZE * 2  # must be at least the size of the largest enemy
+BROADPHASE_MARGIN = TILESIZE // 2  # furthest an enemy moves between the rebuild and a missile's check
+
+# Update scheduling (scheduler.py)
+UPDATE_SCHEDULER = True  # only update enemies near the camera (False: every sprite, every tick)
+ACTIVE_MARGIN = TILESIZE * 4  # enemies this far outside the drawn area are updated every tick
+SLEEP_MARGIN = HEIGHT * 2  # beyond this they sleep (comfortably past the HEIGHT * 1.5 spiders react to the player at)
+REDUCED_RATE = 4  # ticks between updates in between the two
+# Accepted deviation: birds and spiders in the band steer once per update instead of every tick, so they drift from
+# their full rate path- a few pixels usually, but a spider can drop off a different ledge and end up on another
+# platform.  Nothing in the band is on screen.  REDUCED_RATE = 1 keeps every enemy exactly on its full rate path.
+CATCH_UP_BUDGET = 256  # updates per tick spent replaying the ticks woken enemies slept through
+SCHEDULER_REGION = TILESIZE * 4  # size of the map regions sleeping enemies are bucketed by
+
+# Enemy navigation (navigation.py)
+NAV_RADIUS = 30  # cells around the player searched for walking enemies (spiders chase within HEIGHT * 1.5)
+NAV_FLY_RADIUS = 20  # cells around the player searched for flying enemies (birds chase within HEIGHT)
+NAV_CLIMB_ROWS = 12  # highest platform a spider will thread up to, in rows
+NAV_CHANGE_LOG = 4096  # platform changes remembered, so a field only forgets the rows a streamed chunk touched
+
+PICK_UPS = 100  # pick ups scattered over the platforms of a .txt map
 
 MISSILE_WIDTH = 48
 MISSILE_HEIGHT = 48
+MISSILE_POOL_SIZE = 12  # most missiles in flight at once
+MISSILE_FIRE_RATE = 6  # shots per second (0 for no limit)
 
 # Spritesheet data
 player_sprites = {
@@ -55,3 +85,41 @@ pick_up_sprites = {
     "step_x": 24,  # step_x, Step_y: width, height in pixels of individual spritesheet images
     "step_y": 24,
     "image_per_row": 16}  # image_per_row: max nos of images per row
+
+# Streamed (.chunks) maps
+MAP_CHUNK_ROWS = 16  # map rows per chunk when converting (matches STATIC_CHUNK_TILES so baked chunks unload cleanly)
+STREAM_MARGIN = 1  # chunks kept loaded above and below the ones on screen
+STREAM_LOOKAHEAD = 2  # chunks beyond the loaded ones read or generated ahead of time, one per tick
+PICK_UP_DENSITY = 0.33  # pick ups per platform tile in streamed chunks (about the same as map.txt)
+
+# Endless level (chunked_map.EndlessMap)
+ENDLESS_MAP = "endless"  # map file name that plays the endless generated level instead of a file
+ENDLESS_CHUNKS = 2 ** 20  # chunks from the floor to the top- over 600 million pixels, far more than anyone can climb
+ENDLESS_ROW_SPACING = 3  # rows from one platform row to the next
+ENDLESS_PLATFORM_LENGTH = (3, 8)  # shortest, longest platform in tiles
+ENDLESS_GAP = (2, 6)  # narrowest, widest gap between platforms in tiles
+ENDLESS_ENEMIES = 2  # enemies per chunk just above the starting one
+ENDLESS_ENEMY_RAMP = 4  # chunks climbed for every extra enemy per chunk
+ENDLESS_MAX_ENEMIES = 8  # most enemies per chunk
+ENDLESS_ENEMY_MIX = "ccsb"  # map tiles the enemies are picked from (repeat a tile to make it more common)
+ENDLESS_REMEMBER = 4  # chunks past the loaded ones whose collected pick ups and enemies are remembered
+
+# Rendering
+TEXT_CACHE_SIZE = 128  # rendered text surfaces kept before the least recently used is dropped
+DIRTY_RECTS = False  # redraw only changed screen areas while the camera is still (see DirtyRenderer)
+BACKGROUND_LAYERS = (  # furthest first: image in Images, x and y scroll per pixel the camera moves, transparent colour
+    ("Background.png", 0, 0.2, None),)  # (None: the image's own alpha- the furthest layer is always opaque)
+CULL_MARGIN = TILESIZE * 2  # sprites this far outside the screen are still drawn (avoids popping at the edges)
+STATIC_CHUNK_TILES = 16  # static tile layer is baked onto square surfaces this many tiles across
+THREAD_LIMIT = 32  # most spider threads kept at once (one per climbing spider)
+
+# Profiling (F3 toggles the overlay while playing)
+PROFILE = False  # time every frame from the start
+PROFILE_WINDOW = 300  # frames of timings kept for the overlay percentiles
+PROFILE_TRACE = ""  # per-frame trace file, .csv or .json ("" for none)
+
+# Replays (replay.py)
+RECORD_REPLAYS = False  # record every game's controls to REPLAY_DIR so it can be played back
+REPLAY_DIR = "replays"
+REPLAY_BUFFER = 4096  # bytes of ticks held in memory between file writes
+REPLAY_KEEP = 50  # oldest recordings are deleted beyond this many (0 keeps them all)
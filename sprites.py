@@ -1,11 +1,30 @@
 import pygame
-from math import fabs
+from math import ceil, fabs
 from math import sqrt as sqrt
 from settings import *
 from spritesheet_functions import *
+from navigation import cell_at, cell_centre
 vec = pygame.math.Vector2  # 2D vector - x = vec.x  y = vec.y
+collide_pick_up_ratio = pygame.sprite.collide_rect_ratio(0.5)  # built once rather than every collision check
+collide_enemy_ratio = pygame.sprite.collide_rect_ratio(0.7)
+placeholder_images = {}  # (width, height) in tiles: blank image a sprite shows until its first animation frame
+
+
+def placeholder_image(width, height):
+    """ One shared blank surface per sprite size, rather than one per sprite."""
+    image = placeholder_images.get((width, height))
+    if image is None:
+        image = placeholder_images[(width, height)] = pygame.Surface((width * TILESIZE, height * TILESIZE))
+    return image
+
+
+# Sprite attributes live in __slots__, its group set (self.__g, name mangled to _Sprite__g) included.
+# pygame.sprite.Sprite itself isn't slotted, so every sprite still has a __dict__- it just stays empty.  On
+# CPython 3.11 that saves ~11 bytes an enemy (benchmark.py entity_bytes 581 -> 570); the shared placeholder
+# image above is where the real memory went.
 
 class Static_sprite(pygame.sprite.Sprite):
+    __slots__ = ("_Sprite__g", "image", "rect", "pos")
 
     def __init__(self, start_x, start_y, image):
         pygame.sprite.Sprite.__init__(self)
@@ -15,11 +34,13 @@ class Static_sprite(pygame.sprite.Sprite):
         self.rect.topleft = self.pos
 
 class Mobile_sprite(pygame.sprite.Sprite):
+    __slots__ = ("_Sprite__g", "game", "image", "rect", "pos", "vel", "animations", "current_frame", "frames_played",
+                 "anim_start", "time_at", "direction", "actionvar", "newaction")
 
     def __init__(self, game, start_x, start_y, width, height, animations):
         pygame.sprite.Sprite.__init__(self)
         self.game = game
-        self.image = pygame.Surface((width*TILESIZE, height*TILESIZE))
+        self.image = placeholder_image(width, height)
         self.rect = self.image.get_rect()
         self.pos = vec(start_x * TILESIZE, start_y * TILESIZE)  # position in pixels
         self.vel = vec(0, 0)  # velocity vector
@@ -27,17 +48,18 @@ class Mobile_sprite(pygame.sprite.Sprite):
 
         self.animations = animations  # assign corresponding animations dict to sprite
         self.current_frame = 0
+        self.frames_played = 0  # animation frames shown since the current action started
+        self.anim_start = 0  # elapsed game time the current action (animation) started
         self.time_at = 0  # recording elapsed game time e.g. on keydown event (to limit time player can jump for example)
-        self.rem_past = 0  # remainder used to detect when elapsed time has increased by a single time period, and therefore go to next animation frame
         self.direction = "R"  # player facing left or right
 
         self.actionvar = "fall"  # current player action
         self.newaction = "fall"  # new player action on keyboard input- jumping, walking etc
 
-    def collide_platforms(self, platforms):
+    def collide_platforms(self, grid):
 
         self.rect.y += 1  # move player rect down a pixel to check for collision with platform
-        hits = pygame.sprite.spritecollide(self, platforms, False)
+        hits = grid.platforms_hit(self.rect)  # only the map cells under the rect are checked
         self.rect.y -= 1  # move back up having check for collision
         if len(hits) > 0 and self.vel.y >= 0:  # can only fall onto platforms- able to jump through them
 
@@ -45,15 +67,31 @@ class Mobile_sprite(pygame.sprite.Sprite):
                 self.pos.y = hits[0].rect.top  # set sprite y position to top of platform
                 return True
 
+    def move(self, ticks=1):
+        """ pos += vel * ticks, stopping on the first platform top crossed on the way down (swept, so no speed or
+            tick count can carry a sprite through a platform), then place the rect."""
+        dx = self.vel.x * ticks
+        dy = self.vel.y * ticks
+        if dy > 0:
+            top = self.game.grid.landing(self.rect.left, self.rect.width, self.pos.y, dx, dy)
+            if top is not None:
+                dy = top - self.pos.y
+        self.pos.x += dx
+        self.pos.y += dy
+        self.rect.midbottom = self.pos
+
     def change_action(self, newaction):
         """ change action from e.g. jumping to falling.  First check current action to see if action has actually changed then return new actionvar"""
         if self.actionvar != newaction:
             if self.actionvar != "die":
                 self.actionvar = newaction
                 self.current_frame = 0
+                self.frames_played = 0
+                self.anim_start = self.game.elapsed_time
 
 
 class Player(Mobile_sprite):
+    __slots__ = ("runspeed", "jumpspeed", "jumptime", "dead")
 
     def __init__(self, game, start_x, start_y, width, height, animations):
         super().__init__(game, start_x, start_y, width, height, animations)
@@ -64,10 +102,10 @@ class Player(Mobile_sprite):
         self.newaction = "fall"
         self.dead = False
 
-    def collide_enemy(self, enemies):
+    def collide_enemy(self, broadphase):
 
         # collision with enemy from all other directions (players death)
-        hits = pygame.sprite.spritecollide(self, enemies, False, pygame.sprite.collide_rect_ratio(0.7))  # check hits to the right
+        hits = broadphase.hits(self, collide_enemy_ratio)
 
         if hits and self.vel.y > 0:
             hits[0].kill()
@@ -76,10 +114,11 @@ class Player(Mobile_sprite):
             self.dead = True
             self.newaction = "die"
 
-    def collide_pick_up(self, pick_ups):
+    def collide_pick_up(self, grid):
 
-        hits = pygame.sprite.spritecollide(self, pick_ups, False, pygame.sprite.collide_rect_ratio(0.5))
+        hits = [pick_up for pick_up in grid.pick_ups_near(self.rect) if collide_pick_up_ratio(self, pick_up)]
         if hits:
+            grid.remove_pick_up(hits[0])
             hits[0].kill()
             hits[0].apply_pickup(self)
 
@@ -95,48 +134,46 @@ class Player(Mobile_sprite):
 
     def shoot(self):
 
-        self.missile = Missile(self.game, self.rect.centerx, self.rect.centery, 1, 1, self.game.missile_animations, self)
-        self.game.missiles.add(self.missile)
-        self.game.all_sprites.add(self.missile)
+        self.game.missile_pool.fire(self)  # no shot if the fire rate cooldown is running or the pool is empty
 
     def update(self):
 
         # self.vel = vec(0, FALL_VELOCITY)
 
-        keys = pygame.key.get_pressed()
+        inputs = self.game.inputs  # input state for this tick (keyboard or injected)
 
         # Check platform collision
-        if self.collide_platforms(self.game.platforms) is True:
-            self.vel = vec(0, 0)
+        if self.collide_platforms(self.game.grid) is True:
+            self.vel.update(0, 0)  # in place- no new vector every tick
             self.newaction = "idle"
         else:
-            self.vel = vec(0, FALL_VELOCITY)
+            self.vel.update(0, FALL_VELOCITY)
             self.newaction = "fall"
 
         # KEY INPUT
-        if keys[pygame.K_LEFT] or keys[pygame.K_a]:
+        if inputs.left:
             self.vel.x = -self.runspeed
             self.direction = "L"
 
-        elif keys[pygame.K_RIGHT] or keys[pygame.K_d]:
+        elif inputs.right:
             self.vel.x = self.runspeed
             self.direction = "R"
 
-        if keys[pygame.K_SPACE] or keys[pygame.K_j]:
+        if inputs.jump:
             self.jump()  # change self.newaction to "jump", if applicable
 
         if self.vel.y == 0 and self.vel.x != 0:
             self.newaction = "walk"
 
         # check sprite collisions
-        self.collide_enemy(self.game.enemies)
-        self.collide_pick_up(self.game.pick_ups)
+        self.collide_enemy(self.game.broadphase)
+        self.collide_pick_up(self.game.grid)
 
         self.change_action(self.newaction)  # change self.actionvar to new action
 
         if self.dead:
-            self.vel = vec(0, 10)
-            if self.current_frame + 1 == len(self.game.player_animations["die"][self.direction]):  # on last frame of death animation
+            self.vel.update(0, 10)
+            if self.frames_played + 1 >= self.animations["die"].count:  # on (or past) last frame of death animation
                 self.game.playing = False
 
         # wrap around the sides of the screen
@@ -145,29 +182,38 @@ class Player(Mobile_sprite):
         if self.pos.x < 0:
             self.pos.x = WIDTH
 
-        self.pos += self.vel
-        self.rect.midbottom = self.pos
+        self.move()
 
 
 class Missile(Mobile_sprite):
+    __slots__ = ("pool",)
 
-    def __init__(self, game, start_x, start_y, width, height, animations, player):
+    def __init__(self, game, start_x, start_y, width, height, animations, pool=None):
 
-        self.image = pygame.Surface((MISSILE_WIDTH, MISSILE_HEIGHT))
         super().__init__(game, start_x, start_y, width, height, animations)
-        self.pos = vec(player.rect.centerx, player.rect.centery)  # position and vel need reassignment for missile class
-        self.vel = vec(10, 0)
+        self.pool = pool  # MissilePool the missile is returned to when it explodes or leaves the screen
+        self.actionvar = "fly"
+        self.newaction = "fly"
+        self.animations = animations  # assign corresponding animations dict to sprite
+
+    def launch(self, player):
+        """ Reset a pooled missile to fly from the centre of player in the direction they face."""
+        self.pos.update(player.rect.centerx, player.rect.centery)
+        self.vel.update(10, 0)
+        self.direction = player.direction
         if player.direction == "L":
             self.vel.x *= -1  # reverse bullet direction
-            self.direction = "L"
+        self.rect.center = self.pos
 
         self.actionvar = "fly"
         self.newaction = "fly"
-        self.animations = animations  # assign corresponding animations dict to sprite
+        self.current_frame = 0
+        self.frames_played = 0
+        self.anim_start = self.game.elapsed_time
 
-    def collide_enemy(self, enemies):
+    def collide_enemy(self, broadphase):
 
-        hits = pygame.sprite.spritecollide(self, enemies, False, pygame.sprite.collide_rect_ratio(0.7))
+        hits = broadphase.hits(self, collide_enemy_ratio)
         if hits:
             hits[0].kill()
             self.newaction = "explode"
@@ -175,25 +221,56 @@ class Missile(Mobile_sprite):
     def update(self):
 
         self.pos += self.vel
-        self.collide_enemy(self.game.enemies)
+        self.collide_enemy(self.game.broadphase)
         self.rect.center = self.pos
         self.change_action(self.newaction)
 
         if self.actionvar == "explode":
-            self.vel = (0, 0)
-            if self.current_frame + 1 == len(self.game.missile_animations["explode"][self.direction]):  # on last frame of explosion animation
-                self.kill()
+            self.vel.update(0, 0)
+            if self.frames_played + 1 >= self.animations["explode"].count:  # on (or past) last frame of explosion animation
+                self.pool.recycle(self)
+                return
 
         if self.pos.x < 0 or self.pos.x > WIDTH:
-            self.kill()  # if bullet goes off screen
+            self.pool.recycle(self)  # if bullet goes off screen
+
+
+class MissilePool:
+    """ Fixed set of missiles created with the level and reused for every shot, so firing never builds new
+        sprites, surfaces or vectors.  Shots are dropped while the fire rate cooldown is running or every
+        missile is already in flight. """
+
+    def __init__(self, game, size=MISSILE_POOL_SIZE, fire_rate=MISSILE_FIRE_RATE):
+        self.game = game
+        self.free = [Missile(game, 0, 0, 1, 1, game.missile_animations, self) for i in range(size)]
+        self.cooldown = 1 / fire_rate if fire_rate else 0  # seconds between shots
+        self.next_shot = 0  # elapsed game time the next shot is allowed
+
+    def fire(self, player):
+        """ Launch a free missile from player.  Returns it, or None if the shot was dropped."""
+        if not self.free or self.game.elapsed_time < self.next_shot:
+            return None
+        missile = self.free.pop()
+        missile.launch(player)
+        self.game.missiles.add(missile)
+        self.game.all_sprites.add(missile)
+        self.next_shot = self.game.elapsed_time + self.cooldown
+        return missile
+
+    def recycle(self, missile):
+        """ Take a missile out of play and make it available to fire again."""
+        if missile.alive():
+            missile.kill()
+            self.free.append(missile)
 
 
 class Caterpillar(Mobile_sprite):
+    __slots__ = ()
 
     def __init__(self, game, start_x, start_y, width, height, animations):
         super().__init__(game, start_x, start_y, width, height, animations)
 
-        self.vel = vec(CTPLL_SPEED, 0)
+        self.vel.update(CTPLL_SPEED, 0)
 
         self.actionvar = "walk"  # only walk back and forth along platforms
         self.animations = animations  # assign corresponding animations dict to sprite
@@ -203,7 +280,7 @@ class Caterpillar(Mobile_sprite):
         d = self.vel.x / fabs(self.vel.x)  # returns either +/-1 (direction of travel)
 
         self.rect.x += self.rect.width * d  # check if at platform edge
-        if self.collide_platforms(self.game.platforms) is not True:
+        if self.collide_platforms(self.game.grid) is not True:
             self.vel.x *= -1  # turn around
         self.rect.x += self.rect.width*d*-1  # undo rect.x increase
 
@@ -212,48 +289,66 @@ class Caterpillar(Mobile_sprite):
         else:
             self.direction = "L"
 
-    def update(self):
-
-        self.turn_around()
-        self.pos += self.vel
-        self.rect.midbottom = self.pos
+    def update(self, ticks=1):
+        """ ticks > 1 covers that many ticks (UpdateScheduler band).  The platform edge check only reads the cells
+            under the rect, so it can't change until the checked rect reaches another column- up to there the
+            caterpillar moves in one go, turning exactly where it would have at full rate."""
+        while ticks > 0:
+            speed = self.vel.x
+            y = self.pos.y
+            self.turn_around()
+            run = 1
+            if self.vel.x == speed and self.pos.y == y:  # carried on without turning or settling onto a platform
+                left = self.rect.x + self.rect.width * (1 if speed > 0 else -1)  # rect turn_around checks
+                right = left + self.rect.width - 1
+                if speed > 0:
+                    gap = min(TILESIZE - left % TILESIZE, TILESIZE - right % TILESIZE)  # pixels to the next column
+                else:
+                    gap = min(left % TILESIZE, right % TILESIZE) + 1
+                run = min(ticks, max(1, ceil((gap - 1) / fabs(speed))))  # -1 allows for the rect rounding pos
+            self.move(run)
+            ticks -= run
 
 
 class Bird(Mobile_sprite):
+    __slots__ = ()
 
     def __init__(self, game, start_x, start_y, width, height, animations):
 
         super().__init__(game, start_x, start_y, width, height, animations)
         self.actionvar = "fly"
         self.animations = animations  # assign corresponding animations dict to sprite
-        self.n_past = 0  # for chase player method
 
     def chase_player(self, player):
+        """ Fly towards the player and around platforms, following the navigation fly field."""
+        field = self.game.navigation.fly
+        step = field.step_from(cell_at(*self.rect.center), 2)  # aim 2 cells ahead to smooth the corners
+        if step is None:  # in the player's cell (or no way round)- head straight for them
+            target_x, target_y = player.rect.center
+        else:
+            target_x, target_y = cell_centre(step)
 
-        n = self.game.elapsed_time % 0.5
-
-        if n < self.n_past:  # recalculate disp vector every 1 second
-
-            target_vec = player.pos - self.pos  # displacement vector between player and enemy
-            unit_vec = 1 / sqrt(target_vec.x**2 + target_vec.y**2)  # unit vector for displacement
-
-            self.vel.x = target_vec.x * unit_vec * BIRD_SPEED  # resultant x velocity
-            self.vel.y = target_vec.y * unit_vec * BIRD_SPEED
-
-        self.n_past = n
+        target_x -= self.rect.centerx  # displacement vector between player and enemy
+        target_y -= self.rect.centery
+        distance = sqrt(target_x**2 + target_y**2)
+        if distance:
+            self.vel.x = target_x / distance * BIRD_SPEED  # resultant x velocity
+            self.vel.y = target_y / distance * BIRD_SPEED
 
-    def update(self):
+    def update(self, ticks=1):
 
         if fabs(self.game.player.pos.y - self.pos.y) < HEIGHT:  # if enemy within screen height of player
             self.chase_player(self.game.player)
         else:  # stop chasing player if outside screen height
-            self.vel = vec(0, 0)
+            self.vel.update(0, 0)
 
-        self.pos += self.vel
+        self.pos.x += self.vel.x * ticks
+        self.pos.y += self.vel.y * ticks
         self.rect.midbottom = self.pos
 
 
 class Spider(Mobile_sprite):
+    __slots__ = ()
 
     def __init__(self, game, start_x, start_y, width, height, animations):
         super().__init__(game, start_x, start_y, width, height, animations)
@@ -265,40 +360,54 @@ class Spider(Mobile_sprite):
     def chase_player(self, player):
         self.newaction = "walk"
         if fabs(player.pos.y - self.pos.y) < HEIGHT*1.5:  # if enemy within 1&half x screen height of player
-            target_x = player.pos.x - self.pos.x  # x displacement between player and enemy
-            if target_x != 0:
-                d = target_x / fabs(target_x)  # returns either +/-1 (direction of travel)
-                self.vel.x = SPIDER_SPEED * d  # pursue player along platform
+            cell = cell_at(self.pos.x, self.pos.y)  # pos was just put on the platform top by collide_platforms
+            step = self.game.navigation.walk.step_from(cell)  # next cell on the way to the player
+            if step is None:  # on the player's platform (or no way there)- pursue player along platform
+                self.walk_to(player.pos.x)
+                self.climb(player)
+            elif step[1] < cell[1]:  # thread up to the platform above- line up with the cell first
+                centre_x = cell_centre(cell)[0]
+                if self.pos.x == centre_x:
+                    self.climb_to((self.pos.x, (step[1] + 1) * TILESIZE))
+                else:
+                    self.vel.x = max(-SPIDER_SPEED, min(SPIDER_SPEED, centre_x - self.pos.x))
+            else:  # walk along, or off the end of, the platform
+                self.vel.x = SPIDER_SPEED if step[0] > cell[0] else -SPIDER_SPEED
+
+    def walk_to(self, x):
+        target_x = x - self.pos.x  # x displacement between target and enemy
+        if target_x != 0:
+            d = target_x / fabs(target_x)  # returns either +/-1 (direction of travel)
+            self.vel.x = SPIDER_SPEED * d
 
     def climb(self, player):
         """ Climb to platform above when directly underneath player"""
-        if fabs(player.pos.y - self.pos.y) < HEIGHT*1.5:  # if enemy within 1&half x screen height of player
-            target_x = self.pos.x - player.pos.x  # x displacement between player and enemy
-            target_y = self.pos.y - player.pos.y
+        target_x = self.pos.x - player.pos.x  # x displacement between player and enemy
+        target_y = self.pos.y - player.pos.y
 
-            if player.actionvar == "idle" or player.actionvar == "walk":
-                if target_y > 0 and target_x == 0:  # player on platform directly above
+        if player.actionvar == "idle" or player.actionvar == "walk":
+            if target_y > 0 and target_x == 0:  # player on platform directly above
+                self.climb_to(player.pos)
 
-                    self.newaction = "climb"
-                    thread_coords = (self.pos[:], player.pos[:])  # start, end position vectors for drawing thread
-                    self.game.thread_coords.append(thread_coords)
+    def climb_to(self, end):
+        self.newaction = "climb"
+        self.game.threads.attach(self, self.pos, end)  # start, end positions for drawing thread
 
-    def update(self):
+    def update(self, ticks=1):
 
-        self.vel = vec(0, FALL_VELOCITY)
+        self.vel.update(0, FALL_VELOCITY)
 
-        if self.collide_platforms(self.game.platforms) is True:
-            self.chase_player(self.game.player)
-            self.climb(self.game.player)  # change self.newaction = "climb", if aligned with player
+        if self.collide_platforms(self.game.grid) is True:
+            self.chase_player(self.game.player)  # change self.newaction = "climb" to go up a platform
 
         if self.newaction == "climb":
             self.vel.y = -SPIDER_SPEED
 
-        self.pos += self.vel
-        self.rect.midbottom = self.pos
+        self.move(ticks)
 
 
 class Platform(Static_sprite):
+    __slots__ = ()
 
     def __init__(self, start_x, start_y, image):
         "Generates a single platform tile."
@@ -306,6 +415,7 @@ class Platform(Static_sprite):
 
 
 class Pick_up(Static_sprite):
+    __slots__ = ()
 
     def __init__(self, start_x, start_y, image):
         "Generates a single pick_up tile."
@@ -316,6 +426,7 @@ class Pick_up(Static_sprite):
 
 
 class Speedboost(Pick_up):
+    __slots__ = ()
 
     def __init__(self, start_x, start_y, image):
         super().__init__(start_x, start_y, image)
@@ -325,6 +436,7 @@ class Speedboost(Pick_up):
 
 
 class Jumpboost(Pick_up):
+    __slots__ = ()
 
     def __init__(self, start_x, start_y, image):
         super().__init__(start_x, start_y, image)
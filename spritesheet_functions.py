@@ -11,24 +11,46 @@ class SpriteSheet():
     WHITE = (255, 255, 255)
     BLUE = (0, 0, 255)
 
-    def __init__(self, spritesheet_dict):
-        """ Constructor. Pass in the file name of the sprite sheet. """
+    def __init__(self, spritesheet_dict, frame_cache=None):
+        """ Constructor. Pass in the sprite sheet dictionary from settings and optionally a FrameCache. """
         self.spritesheet_dict = spritesheet_dict  # load sprite sheet dictionary from settings
-        self.sprite_sheet = pygame.image.load(path.join("Images", spritesheet_dict["file_name"])).convert()  # Load the sprite sheet image file
+        self.sprite_sheet = None  # sheet image is only loaded if a frame isn't already cached
+        self.decoded_sheet = None  # sheet image read by load_sheet(), converted when the first frame is cut
         self.backgroundcolour = spritesheet_dict["background"]
+        self.frame_cache = frame_cache
 
-    def get_image(self, x, y, width, height, w_new, h_new):
+    def load_sheet(self):
+        """ Read and decode the sheet image without converting it, so it can be done on a loader thread."""
+        self.decoded_sheet = pygame.image.load(path.join("Images", self.spritesheet_dict["file_name"]))
+
+    def get_image(self, x, y, width, height, w_new, h_new, flip=False):
         """ Grab a single image out of a larger spritesheet
             Pass in the x, y location of the sprite
             and the width and height of the sprite. """
+        key = (self.spritesheet_dict["file_name"], x, y, width, height, w_new, h_new, flip)
+        if self.frame_cache is not None:
+            image = self.frame_cache.get(key)
+            if image is not None:
+                return image
+
+        if self.sprite_sheet is None:
+            if self.decoded_sheet is None:
+                self.load_sheet()  # Load the sprite sheet image file
+            self.sprite_sheet = self.decoded_sheet.convert()
+            self.decoded_sheet = None
         image = pygame.Surface([width, height]).convert()  # Create a new blank image
         image.blit(self.sprite_sheet, (0, 0), (x, y, width, height))  # Copy the sprite from the large sheet onto the smaller image
         image = pygame.transform.scale(image, (w_new, h_new))  # resize image
+        if flip:
+            image = pygame.transform.flip(image, True, False)  # face left
         # Assuming black works as the transparent color
         image.set_colorkey(self.backgroundcolour)
+
+        if self.frame_cache is not None:
+            self.frame_cache.put(key, image, self.backgroundcolour)
         return image
 
-    def load_animation(self, col, row, w_new, h_new, image_count):
+    def load_animation(self, col, row, w_new, h_new, image_count, flip=False):
         """ Resize individual image to w_new by h_new according to sprite dimensions and append to animation list."""
 
         animation = []
@@ -39,7 +61,7 @@ class SpriteSheet():
         while len(animation) < image_count:
 
             if col < self.spritesheet_dict["image_per_row"]:
-                image = self.get_image(i, j, self.spritesheet_dict["step_x"], self.spritesheet_dict["step_y"], w_new, h_new)
+                image = self.get_image(i, j, self.spritesheet_dict["step_x"], self.spritesheet_dict["step_y"], w_new, h_new, flip)
                 animation.append(image)
                 i += self.spritesheet_dict["step_x"]
                 col += 1
@@ -0,0 +1,65 @@
+"""
+This module caches fonts and rendered text so the HUD and menus don't rebuild them every frame.
+"""
+import pygame
+from collections import OrderedDict
+from settings import *
+
+FONT_NAME = 'freesansbold.ttf'
+
+
+class TextRenderer:
+    """ Fonts are cached by size and rendered surfaces by (text, size, colour) with least recently used eviction.
+        Numbers that change every frame (e.g. the score) are composed from cached single digit glyphs so each new
+        value doesn't fill the cache with a surface that will never be drawn again. """
+
+    def __init__(self, max_surfaces=TEXT_CACHE_SIZE):
+        self.fonts = {}  # size: pygame Font
+        self.surfaces = OrderedDict()  # (text, size, colour): rendered surface, oldest first
+        self.max_surfaces = max_surfaces
+
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            font = self.fonts[size] = pygame.font.Font(FONT_NAME, size)
+        return font
+
+    def render(self, text, size, colour):
+        key = (text, size, tuple(colour))
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)  # most recently used
+            return surface
+
+        surface = self.font(size).render(text, True, colour)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_surfaces:
+            self.surfaces.popitem(last=False)  # evict least recently used
+        return surface
+
+    def draw(self, screen, text, size, colour, x, y):
+        """ Blit text centred on (x, y)."""
+        for surface, position in self.layout(text, size, colour, x, y):
+            screen.blit(surface, position)
+
+    def layout(self, text, size, colour, x, y):
+        """ List of (surface, topleft) needed to draw text centred on (x, y)."""
+        if text.isdigit():
+            return self.layout_digits(text, size, colour, x, y)
+        surface = self.render(text, size, colour)
+        text_rect = surface.get_rect()
+        text_rect.center = (x, y)
+        return [(surface, text_rect.topleft)]
+
+    def layout_digits(self, text, size, colour, x, y):
+        """ Lay out a string of digits glyph by glyph, centred on (x, y)."""
+        glyphs = [self.render(char, size, colour) for char in text]
+        width = sum(glyph.get_width() for glyph in glyphs)
+        height = max(glyph.get_height() for glyph in glyphs)
+        left = int(x - width / 2)
+        top = int(y - height / 2)
+        placed = []
+        for glyph in glyphs:
+            placed.append((glyph, (left, top)))
+            left += glyph.get_width()
+        return placed